@@ -0,0 +1,249 @@
+"""Нагрузочный тест обработчиков бота без доступа к сети.
+
+Собирает настоящий Dispatcher со всеми роутерами из main.py, подменяет
+HTTP-сессию бота заглушкой, которая только записывает вызовы API, и
+прогоняет через Dispatcher.feed_update тысячи синтетических обновлений:
+/start, профиль, таблица лидеров, поиск тем, добавление слов, повторение
+слов, просмотр слов темы и карточки времён.
+
+    python benchmark.py --users 50 --rounds 20 --concurrency 10
+
+Бот работает с копией базы во временном каталоге, исходный файл не меняется.
+В конце печатается таблица: число вызовов каждого обработчика, его
+пропускная способность и задержки p50/p95/p99.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import AsyncGenerator, Optional
+
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Update
+
+from callbacks import NS, pack
+from fake_bot_api import fake_result, make_callback_update, make_inline_query_update, make_message_update
+
+DEFAULT_TOKEN = "42:BENCHMARK"
+
+
+def prepare_environment(source_db: str) -> str:
+    """Копирует базу во временный каталог и настраивает бота до импорта main.py."""
+    workdir = tempfile.mkdtemp(prefix="bot-benchmark-")
+    db_file = os.path.join(workdir, "database.db")
+    if os.path.exists(source_db):
+        shutil.copy(source_db, db_file)
+    os.environ["BOT_DB_FILE"] = db_file
+    os.environ.setdefault("BOT_TOKEN", DEFAULT_TOKEN)
+    os.environ["BOT_PROXY"] = ""
+    os.environ.setdefault("METRICS_PORT", "")
+    return db_file
+
+
+def percentile(values: list[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+class StubSession(BaseSession):
+    """Сессия бота, которая отвечает на вызовы API правдоподобными данными без сети."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls: Counter = Counter()
+
+    async def make_request(self, bot, method, timeout: Optional[int] = None):
+        name = method.__api_method__
+        self.calls[name] += 1
+        payload = {"chat_id": getattr(method, "chat_id", None), "text": getattr(method, "text", None)}
+        content = self.json_dumps({"ok": True, "result": fake_result(name, payload)})
+        return self.check_response(bot=bot, method=method, status_code=200, content=content).result
+
+    async def stream_content(self, url: str, headers: Optional[dict] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+class Recorder:
+    """Собирает задержки обработки обновлений по имени обработчика."""
+
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self._handlers: dict[int, str] = {}
+
+    async def middleware(self, handler, event, data: dict):
+        # Внутренний middleware видит, какой обработчик выбран для обновления
+        handler_object = data.get("callback_handler", data["handler"])
+        self._handlers[data["event_update"].update_id] = handler_object.callback.__name__
+        return await handler(event, data)
+
+    def handler_name(self, update_id: int, fallback: str) -> str:
+        return self._handlers.pop(update_id, fallback)
+
+
+async def seed_topics(users: list[int], words_per_topic: int) -> dict[int, tuple[int, str]]:
+    """Создаёт каждому пользователю тему со словами; возвращает user_id -> (topic_id, название)."""
+    from database import db
+
+    topics = {}
+    for user_id in users:
+        name = f"Benchmark topic {user_id}"
+        await db.execute("DELETE FROM topics WHERE author_id = ? AND content = ?", (user_id, name))
+        await db.execute("INSERT INTO topics (author_id, content, visible) VALUES (?, ?, 1)", (user_id, name))
+        topic_id = await db.fetchval("SELECT id FROM topics WHERE author_id = ? AND content = ?", (user_id, name))
+        await db.execute("DELETE FROM user_dictionary WHERE topic_id = ?", (topic_id,))
+        await db.executemany(
+            "INSERT INTO user_dictionary (user_id, topic_id, word, translation) VALUES (?, ?, ?, ?)",
+            [(user_id, topic_id, f"word{i}", f"слово{i}") for i in range(words_per_topic)])
+        topics[user_id] = (topic_id, name)
+    return topics
+
+
+def build_scenario(user_id: int, topic_id: int, topic_name: str, tense_count: int, round_no: int) -> list:
+    """Последовательность действий одного пользователя: ("m" | "c" | "i", данные) или ("answer", None)."""
+    steps = [
+        ("m", "/start"),
+        ("m", "Профиль"),
+        ("c", pack(NS.TOP_LEADERS)),
+        ("i", "поиск тем для повторения: Benchmark"),
+        ("i", "поиск темы для добавления слов: ben"),
+        ("m", f"Для повторения была выбрана тема: {topic_name}"),
+        ("c", pack(NS.SHOW_WORDS, topic_id)),
+        ("c", pack(NS.WORD_PAGE, 1, topic_id)),
+        ("m", f"Вы выбрали тему: {topic_name}"),
+        ("c", pack(NS.ADD_WORDS, topic_id)),
+        ("m", f"extra{round_no}"),
+        ("m", f"дополнительно{round_no}"),
+        ("c", pack(NS.ENG_RU, topic_id)),
+        ("answer", None),
+        ("m", "неверный ответ"),
+        ("answer", None),
+        ("answer", None),
+        ("m", "Прекратить повтор"),
+    ]
+    steps.append(("c", pack(NS.TENSE, round_no % tense_count)))
+    return steps
+
+
+async def run(args: argparse.Namespace) -> int:
+    # Модули бота читают настройки при импорте, поэтому импортируются после prepare_environment
+    import main
+    from database import db
+    from functions import grammar
+    from outbound import send_scheduler
+    from shared import bot
+
+    logging.getLogger().setLevel(logging.WARNING)
+    main.migrate(os.environ["BOT_DB_FILE"])
+
+    session = StubSession()
+    for middleware in bot.session.middleware:
+        # Без --rate-limit лимиты Telegram не применяются, чтобы измерять сами обработчики
+        if middleware is not send_scheduler or args.rate_limit:
+            session.middleware(middleware)
+    bot.session = session
+    dp = main.dp
+    recorder = Recorder()
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(recorder.middleware)
+
+    try:
+        await dp.emit_startup(bot=bot)
+        users = [900_000_000 + i for i in range(args.users)]
+        topics = await seed_topics(users, args.words)
+        me = await bot.me()
+
+        async def feed(update_dict: dict, label: str) -> None:
+            update = Update.model_validate(update_dict, context={"bot": bot})
+            started = time.perf_counter()
+            failed = False
+            try:
+                await dp.feed_update(bot, update)
+            except Exception as e:
+                failed = True
+                logging.debug(f"{label}: {e!r}")
+            elapsed = time.perf_counter() - started
+            # Задержки и ошибки считаются под одним и тем же именем обработчика
+            name = recorder.handler_name(update.update_id, label)
+            recorder.latencies[name].append(elapsed)
+            if failed:
+                recorder.errors[name] += 1
+
+        async def simulate_user(user_id: int) -> None:
+            topic_id, topic_name = topics[user_id]
+            key = StorageKey(bot_id=me.id, chat_id=user_id, user_id=user_id)
+            for round_no in range(args.rounds):
+                for kind, payload in build_scenario(user_id, topic_id, topic_name, len(grammar.ACTIVE_TENSES),
+                                                    round_no):
+                    if kind == "answer":
+                        # Верный ответ на текущий вопрос викторины
+                        data = await dp.storage.get_data(key)
+                        kind, payload = "m", data.get("current_translation") or "?"
+                    if kind == "m":
+                        await feed(make_message_update(user_id, payload), f"message {payload[:20]!r}")
+                    elif kind == "c":
+                        await feed(make_callback_update(user_id, payload), f"callback {payload.split(':')[0]}")
+                    else:
+                        await feed(make_inline_query_update(user_id, payload), "inline query")
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def limited(user_id: int) -> None:
+            async with semaphore:
+                await simulate_user(user_id)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(limited(user_id) for user_id in users))
+        wall = time.perf_counter() - started
+    finally:
+        # Иначе потоки пула и записи не дадут процессу завершиться после ошибки
+        try:
+            await dp.emit_shutdown(bot=bot)
+        finally:
+            await db.close()
+
+    total = sum(len(values) for values in recorder.latencies.values())
+    print(f"\n{total} updates in {wall:.2f} s: {total / wall:.0f} updates/s "
+          f"(users={args.users}, rounds={args.rounds}, concurrency={args.concurrency})\n")
+    print(f"{'handler':<36}{'count':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, values in sorted(recorder.latencies.items(), key=lambda item: -sum(item[1])):
+        # ops/s — сколько обновлений этого обработчика обработано за секунду всего прогона
+        print(f"{name:<36}{len(values):>8}{len(values) / wall:>10.0f}"
+              f"{percentile(values, 0.50) * 1000:>10.2f}{percentile(values, 0.95) * 1000:>10.2f}"
+              f"{percentile(values, 0.99) * 1000:>10.2f}{recorder.errors.get(name, 0):>8}")
+    print(f"\nBot API calls: {dict(session.calls.most_common())}")
+    return 1 if recorder.errors else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="database.db", help="база, копия которой используется в тесте")
+    parser.add_argument("--users", type=int, default=50, help="число виртуальных пользователей")
+    parser.add_argument("--rounds", type=int, default=10, help="сколько раз каждый пользователь проходит сценарий")
+    parser.add_argument("--words", type=int, default=60, help="число слов в теме каждого пользователя")
+    parser.add_argument("--concurrency", type=int, default=10, help="сколько пользователей действуют одновременно")
+    parser.add_argument("--rate-limit", action="store_true", help="отправлять сообщения с лимитами Telegram")
+    args = parser.parse_args()
+
+    db_file = prepare_environment(args.db)
+    try:
+        return asyncio.run(run(args))
+    except Exception as e:
+        logging.error(f"Benchmark failed: {e!r}")
+        return 1
+    finally:
+        shutil.rmtree(os.path.dirname(db_file), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
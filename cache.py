@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """Кэш в памяти с вытеснением давно не использованных записей.
+
+    Если задан ttl (в секундах), записи старше него считаются отсутствующими.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        stored_at, value = item
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        return item[1] if item is not None else default
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+# Обработчики, которые сбрасывают закэшированные данные темы при изменении её слов
+_topic_listeners: list[Callable[[int], None]] = []
+
+
+def on_topic_changed(listener: Callable[[int], None]) -> Callable[[int], None]:
+    _topic_listeners.append(listener)
+    return listener
+
+
+# Функция для оповещения кэшей о том, что слова темы изменились
+def topic_changed(topic_id: int) -> None:
+    for listener in _topic_listeners:
+        listener(int(topic_id))
+
+
+# Обработчики, которые сбрасывают закэшированные списки тем при создании и удалении тем
+_topic_list_listeners: list[Callable[[], None]] = []
+
+
+def on_topic_list_changed(listener: Callable[[], None]) -> Callable[[], None]:
+    _topic_list_listeners.append(listener)
+    return listener
+
+
+# Функция для оповещения кэшей о том, что тема появилась или удалена
+def topic_list_changed() -> None:
+    for listener in _topic_list_listeners:
+        listener()
+
+
+# Обработчики, которые сбрасывают закэшированные данные при изменении имени пользователя
+_user_listeners: list[Callable[[int], None]] = []
+
+
+def on_user_changed(listener: Callable[[int], None]) -> Callable[[int], None]:
+    _user_listeners.append(listener)
+    return listener
+
+
+# Функция для оповещения кэшей о том, что имя или username пользователя изменились
+def user_changed(user_id: int) -> None:
+    for listener in _user_listeners:
+        listener(int(user_id))
@@ -0,0 +1,131 @@
+import logging
+from typing import Callable, Optional, Union
+
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.types import CallbackQuery
+
+# Telegram принимает callback_data длиной не больше 64 байт
+MAX_CALLBACK_DATA_BYTES = 64
+SEPARATOR = ":"
+
+CallbackArg = Union[int, str]
+
+
+class NS:
+    """Пространства имён callback_data: один символ перед аргументами.
+
+    Кнопка "Слова в теме" для темы 42 — это "w:42".
+    """
+
+    START_LEARNING = "s"
+    TOP_LEADERS = "L"
+    MY_REFS = "R"
+    REMINDERS = "m"
+
+    ADD_WORDS = "a"
+    IMPORT_WORDS = "i"
+    EXPORT_TOPIC = "x"
+    DELETE_TOPIC = "d"
+    CONFIRM_DELETE = "D"
+    CANCEL_DELETE = "n"
+
+    ENG_RU = "e"
+    RU_ENG = "r"
+    SHOW_WORDS = "w"
+    WORD_PAGE = "p"
+    DELETE_WORD = "W"
+    GO_BACK = "b"
+
+    IRREGULAR_VERBS = "v"
+    CONTINUE_SERIES = "c"
+    TIME_SELECT = "t"
+    ACTIVE_VOICE = "A"
+    PASSIVE_VOICE = "P"
+    TENSE = "T"
+
+
+# Префиксы старого формата "eng_ru:12": кнопки в уже отправленных сообщениях должны работать
+LEGACY_PREFIXES = {
+    "start_learning": NS.START_LEARNING,
+    "top_leaders": NS.TOP_LEADERS,
+    "my_refs": NS.MY_REFS,
+    "add_words": NS.ADD_WORDS,
+    "import_words": NS.IMPORT_WORDS,
+    "export_topic": NS.EXPORT_TOPIC,
+    "delete_topic": NS.DELETE_TOPIC,
+    "confirm_delete": NS.CONFIRM_DELETE,
+    "cancel_delete": NS.CANCEL_DELETE,
+    "eng_ru": NS.ENG_RU,
+    "ru_eng": NS.RU_ENG,
+    "show_words": NS.SHOW_WORDS,
+    "word_page": NS.WORD_PAGE,
+    "delete_word": NS.DELETE_WORD,
+    "go_back": NS.GO_BACK,
+    "irregular_verbs": NS.IRREGULAR_VERBS,
+    "continue_series": NS.CONTINUE_SERIES,
+    "time_select": NS.TIME_SELECT,
+    "select_active_voice": NS.ACTIVE_VOICE,
+    "select_passive_voice": NS.PASSIVE_VOICE,
+}
+# Старые префиксы, у которых единственный аргумент — название темы. Оно передаётся как есть:
+# может состоять из цифр и содержать двоеточия
+LEGACY_TEXT_PREFIXES = {"go_back"}
+# Старые значения целиком (например, "active_past_simple"), их регистрируют модули
+LEGACY_CALLBACKS: dict[str, str] = {}
+
+_handlers: dict[str, CallableObject] = {}
+
+
+# Функция для упаковки callback_data: пространство имён и аргументы через двоеточие
+def pack(namespace: str, *args: CallbackArg) -> str:
+    data = SEPARATOR.join((namespace, *map(str, args)))
+    if len(data.encode()) > MAX_CALLBACK_DATA_BYTES:
+        raise ValueError(f"callback_data is longer than {MAX_CALLBACK_DATA_BYTES} bytes: {data!r}")
+    return data
+
+
+def _parse_arg(value: str) -> CallbackArg:
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+def unpack(data: str) -> tuple[str, tuple[CallbackArg, ...]]:
+    namespace, *args = data.split(SEPARATOR)
+    if namespace not in _handlers:
+        legacy = LEGACY_CALLBACKS.get(data)
+        if legacy is not None:
+            return unpack(legacy)
+        if namespace in LEGACY_TEXT_PREFIXES:
+            return LEGACY_PREFIXES[namespace], tuple(data.split(SEPARATOR, 1)[1:])
+        namespace = LEGACY_PREFIXES.get(namespace, namespace)
+    return namespace, tuple(map(_parse_arg, args))
+
+
+# Декоратор для регистрации обработчика пространства имён
+def callback_handler(namespace: str) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        if namespace in _handlers:
+            raise ValueError(f"Callback namespace {namespace!r} is already registered")
+        _handlers[namespace] = CallableObject(func)
+        return func
+    return decorator
+
+
+# Фильтр единственного обработчика: выбирает обработчик по пространству имён одним поиском в словаре
+def resolve_callback(callback_query: CallbackQuery) -> Union[bool, dict]:
+    if not callback_query.data:
+        return False
+    namespace, args = unpack(callback_query.data)
+    handler = _handlers.get(namespace)
+    if handler is None:
+        logging.warning(f"Unknown callback data {callback_query.data!r}")
+        return False
+    return {"callback_handler": handler, "callback_args": args}
+
+
+callbacks_router = Router(name="callbacks")
+
+
+@callbacks_router.callback_query(resolve_callback)
+async def dispatch_callback(callback_query: CallbackQuery, callback_handler: CallableObject, **data) -> Optional[object]:
+    return await callback_handler.call(callback_query, **data)
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, Sequence
+
+import aiosqlite
+
+from metrics import timed_query, trace_sql
+from shared import DB_FILE
+
+# Количество долгоживущих соединений в пуле
+POOL_SIZE = 4
+
+# Размер кэша подготовленных выражений на одно соединение
+CACHED_STATEMENTS = 256
+
+# Группировка записей: одна транзакция на пачку из не больше WRITE_BATCH_SIZE запросов,
+# пачка набирается не дольше WRITE_BATCH_DELAY секунд после первого запроса
+WRITE_BATCH_SIZE = 100
+WRITE_BATCH_DELAY = 0.002
+
+Statement = tuple[str, Sequence[Any]]
+
+# Настройки, которые применяются один раз при открытии соединения
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA mmap_size = 67108864",
+)
+
+
+class WriteRequest:
+    __slots__ = ("statements", "future")
+
+    def __init__(self, statements: Sequence[Statement], future: asyncio.Future) -> None:
+        self.statements = statements
+        self.future = future
+
+
+class Database:
+    """Пул асинхронных соединений с SQLite.
+
+    Каждое соединение aiosqlite работает в своём потоке, поэтому запросы
+    не блокируют цикл событий. Соединения открываются один раз и
+    переиспользуются всеми обработчиками.
+
+    Частые мелкие изменения идут через write(): их выполняет одна фоновая
+    задача на своём соединении и коммитит пачкой, так что на много
+    запросов приходится одна транзакция и одна запись журнала на диск.
+    """
+
+    def __init__(self, path: str, size: int = POOL_SIZE) -> None:
+        self.path = path
+        self.size = size
+        self._pool: Optional[asyncio.Queue] = None
+        self._connections: list[aiosqlite.Connection] = []
+        self._open_lock = asyncio.Lock()
+        self._writes: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        # Соединение для записи принадлежит одному потоку, пачка выполняется в нём целиком
+        self._writer_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+
+    async def _connect(self) -> aiosqlite.Connection:
+        # isolation_level=None: одиночные запросы коммитятся сразу,
+        # транзакции открываются явно через transaction()
+        conn = await aiosqlite.connect(self.path, isolation_level=None, cached_statements=CACHED_STATEMENTS)
+        for pragma in CONNECTION_PRAGMAS:
+            await conn.execute(pragma)
+        # Считает все выражения, которые выполняет SQLite, включая тела триггеров
+        await conn.set_trace_callback(trace_sql)
+        return conn
+
+    def _connect_writer(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=CACHED_STATEMENTS)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        conn.set_trace_callback(trace_sql)
+        return conn
+
+    async def _in_writer_thread(self, func: Callable, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._writer_thread, func, *args)
+
+    async def open(self) -> None:
+        async with self._open_lock:
+            if self._pool is not None:
+                return
+            pool = asyncio.Queue(maxsize=self.size)
+            for _ in range(self.size):
+                conn = await self._connect()
+                self._connections.append(conn)
+                pool.put_nowait(conn)
+            self._pool = pool
+            self._writer_conn = await self._in_writer_thread(self._connect_writer)
+            self._writes = asyncio.Queue()
+            self._writer = asyncio.create_task(self._write_loop())
+            logging.info(f"Database pool opened: {self.path} ({self.size} connections)")
+
+    async def close(self) -> None:
+        async with self._open_lock:
+            if self._writer is not None:
+                # Запросы, которые уже в очереди, записываются до закрытия
+                await self._writes.join()
+                self._writer.cancel()
+                await asyncio.gather(self._writer, return_exceptions=True)
+                await self._in_writer_thread(self._writer_conn.close)
+                self._writer = self._writer_conn = self._writes = None
+            for conn in self._connections:
+                await conn.close()
+            self._connections.clear()
+            self._pool = None
+            logging.info("Database pool closed.")
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Берёт соединение из пула и возвращает его обратно после использования."""
+        if self._pool is None:
+            await self.open()
+        pool = self._pool
+        conn = await pool.get()
+        try:
+            yield conn
+        finally:
+            pool.put_nowait(conn)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Выполняет несколько запросов в одной транзакции на одном соединении."""
+        async with self.connection() as conn:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                await conn.execute("ROLLBACK")
+                raise
+            else:
+                await conn.execute("COMMIT")
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        with timed_query(sql):
+            async with self.connection() as conn:
+                async with conn.execute(sql, params) as cursor:
+                    return await cursor.fetchone()
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> list[tuple]:
+        with timed_query(sql):
+            async with self.connection() as conn:
+                async with conn.execute(sql, params) as cursor:
+                    return list(await cursor.fetchall())
+
+    async def fetchval(self, sql: str, params: Sequence[Any] = (), default: Any = None) -> Any:
+        row = await self.fetchone(sql, params)
+        return row[0] if row else default
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Выполняет изменяющий запрос и возвращает количество затронутых строк."""
+        with timed_query(sql):
+            async with self.connection() as conn:
+                async with conn.execute(sql, params) as cursor:
+                    return cursor.rowcount
+
+    async def executemany(self, sql: str, params: Iterable[Sequence[Any]]) -> int:
+        with timed_query(sql):
+            async with self.transaction() as conn:
+                async with conn.executemany(sql, params) as cursor:
+                    return cursor.rowcount
+
+    async def write(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Выполняет изменяющий запрос через общую пачку записи; возвращает количество затронутых строк."""
+        rowcount, = await self.write_all([(sql, params)])
+        return rowcount
+
+    async def write_all(self, statements: Sequence[Statement]) -> list[int]:
+        """Выполняет несколько изменяющих запросов атомарно в составе общей пачки записи.
+
+        Ответ приходит после коммита. Ошибка в одном из запросов откатывает
+        только эту группу, остальные запросы пачки записываются.
+        """
+        if not statements:
+            return []
+        with timed_query(statements[0][0]):
+            if self._writes is None:
+                await self.open()
+            future = asyncio.get_running_loop().create_future()
+            self._writes.put_nowait(WriteRequest(statements, future))
+            return await future
+
+    async def _next_batch(self) -> list[WriteRequest]:
+        queue = self._writes
+        batch = [await queue.get()]
+        deadline = asyncio.get_running_loop().time() + WRITE_BATCH_DELAY
+        while len(batch) < WRITE_BATCH_SIZE:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _apply_batch(self, batch: list[WriteRequest]) -> list[Any]:
+        # Выполняется в потоке записи: одна транзакция на всю пачку,
+        # каждая группа в своей точке сохранения, чтобы её ошибка не откатывала остальные
+        conn = self._writer_conn
+        results: list[Any] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for request in batch:
+                conn.execute("SAVEPOINT write_request")
+                try:
+                    results.append([conn.execute(sql, params).rowcount for sql, params in request.statements])
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_request")
+                    results.append(e)
+                conn.execute("RELEASE write_request")
+            conn.execute("COMMIT")
+        except Exception as e:
+            logging.error(f"Database error: {e}")
+            self._rollback()
+            return [e] * len(batch)
+        return results
+
+    def _rollback(self) -> None:
+        conn = self._writer_conn
+        try:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+        except Exception as e:
+            logging.error(f"Database error while rolling back: {e}")
+
+    async def _write_loop(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                results = await self._in_writer_thread(self._apply_batch, batch)
+            except Exception as e:
+                # Ошибка пачки не должна останавливать запись: отвечаем ею только этой пачке
+                logging.error(f"Write batch failed: {e!r}")
+                await self._in_writer_thread(self._rollback)
+                results = [e] * len(batch)
+            for request, result in zip(batch, results):
+                if not request.future.done():
+                    if isinstance(result, Exception):
+                        request.future.set_exception(result)
+                    else:
+                        request.future.set_result(result)
+                self._writes.task_done()
+
+
+db = Database(DB_FILE)
@@ -0,0 +1,171 @@
+"""Локальная заглушка Telegram Bot API для проверки бота без доступа к сети.
+
+Запуск заглушки и бота в режиме вебхука:
+
+    python fake_bot_api.py serve --port 8081
+    BOT_MODE=webhook BOT_PROXY= TELEGRAM_API_URL=http://127.0.0.1:8081 \\
+        WEBHOOK_URL=http://127.0.0.1:8080 python main.py
+
+Отправка обновления боту (как это сделал бы Telegram):
+
+    python fake_bot_api.py send "/start" --user 1
+
+Все вызовы API, которые сделал бот, доступны по адресу GET /_calls.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from typing import Any, Optional
+
+import orjson
+from aiohttp import ClientSession, web
+
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "Language Nova", "username": "language_nova_bot"}
+
+_message_ids = itertools.count(1)
+_update_ids = itertools.count(1)
+
+
+def _now() -> int:
+    return int(time.time())
+
+
+def make_user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+
+def make_message(chat_id: int, text: Optional[str] = None, from_user: Optional[dict] = None) -> dict:
+    message = {
+        "message_id": next(_message_ids),
+        "date": _now(),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": from_user or BOT_USER,
+    }
+    if text is not None:
+        message["text"] = text
+    return message
+
+
+# Функции для создания входящих обновлений, которые Telegram присылает боту
+def make_message_update(user_id: int, text: str) -> dict:
+    return {"update_id": next(_update_ids), "message": make_message(user_id, text, make_user(user_id))}
+
+
+def make_callback_update(user_id: int, data: str) -> dict:
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": make_user(user_id),
+            "chat_instance": str(user_id),
+            "message": make_message(user_id, "..."),
+            "data": data,
+        },
+    }
+
+
+def make_inline_query_update(user_id: int, query: str) -> dict:
+    return {
+        "update_id": next(_update_ids),
+        "inline_query": {"id": str(next(_update_ids)), "from": make_user(user_id), "query": query, "offset": ""},
+    }
+
+
+def fake_result(method: str, payload: dict) -> Any:
+    """Возвращает правдоподобный ответ Bot API на вызов метода."""
+    method = method.lower()
+    if method == "getme":
+        return BOT_USER
+    if method in {"sendmessage", "senddocument", "editmessagetext", "editmessagereplymarkup"}:
+        chat_id = int(payload.get("chat_id") or 0)
+        return make_message(chat_id, payload.get("text"))
+    if method == "getwebhookinfo":
+        return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+    if method == "getupdates":
+        return []
+    return True
+
+
+class FakeBotAPI:
+    def __init__(self) -> None:
+        self.calls: list[dict] = []
+        self.updates: asyncio.Queue = asyncio.Queue()
+        self.webhook_url: Optional[str] = None
+
+    async def _read_payload(self, request: web.Request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json(loads=orjson.loads)
+        return {key: value for key, value in (await request.post()).items() if isinstance(value, str)}
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        payload = await self._read_payload(request)
+        self.calls.append({"method": method, "payload": payload})
+
+        if method.lower() == "setwebhook":
+            self.webhook_url = payload.get("url")
+        elif method.lower() == "deletewebhook":
+            self.webhook_url = None
+        elif method.lower() == "getupdates":
+            # Поддержка режима polling: отдаём накопленные обновления
+            timeout = float(payload.get("timeout") or 0)
+            updates = []
+            try:
+                updates.append(await asyncio.wait_for(self.updates.get(), timeout=max(timeout, 0.1)))
+            except asyncio.TimeoutError:
+                pass
+            while not self.updates.empty():
+                updates.append(self.updates.get_nowait())
+            return web.json_response({"ok": True, "result": updates}, dumps=lambda o: orjson.dumps(o).decode())
+
+        result = fake_result(method, payload)
+        return web.json_response({"ok": True, "result": result}, dumps=lambda o: orjson.dumps(o).decode())
+
+    async def handle_calls(self, request: web.Request) -> web.Response:
+        return web.json_response(self.calls, dumps=lambda o: orjson.dumps(o).decode())
+
+    async def handle_push_update(self, request: web.Request) -> web.Response:
+        # Обновление для бота, работающего в режиме polling
+        await self.updates.put(await request.json(loads=orjson.loads))
+        return web.json_response({"ok": True})
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle_method)
+        app.router.add_get("/_calls", self.handle_calls)
+        app.router.add_post("/_updates", self.handle_push_update)
+        return app
+
+
+async def send_update(url: str, update: dict, secret: Optional[str] = None) -> int:
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    async with ClientSession() as session:
+        async with session.post(url, data=orjson.dumps(update), headers={"Content-Type": "application/json", **headers}) as response:
+            return response.status
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="запустить заглушку Bot API")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8081)
+
+    send = commands.add_parser("send", help="отправить боту текстовое сообщение")
+    send.add_argument("text")
+    send.add_argument("--user", type=int, default=1)
+    send.add_argument("--url", default="http://127.0.0.1:8080/webhook", help="адрес вебхука бота")
+    send.add_argument("--secret", default=None)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        web.run_app(FakeBotAPI().create_app(), host=args.host, port=args.port)
+    else:
+        status = asyncio.run(send_update(args.url, make_message_update(args.user, args.text), args.secret))
+        print(f"Webhook responded with HTTP {status}")
+
+
+if __name__ == "__main__":
+    main()
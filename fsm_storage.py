@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+
+import orjson
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database import Database, db
+
+# Сколько записей FSM держать в памяти
+MAX_CACHED_RECORDS = 10000
+# Как часто (в секундах) и при каком числе изменений записывать состояния в базу
+FSM_FLUSH_INTERVAL = 1
+FSM_FLUSH_THRESHOLD = 500
+
+
+UPSERT_SQL = """INSERT INTO fsm_states (key, state, data) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data"""
+DELETE_SQL = "DELETE FROM fsm_states WHERE key = ?"
+
+
+class FSMRecord(NamedTuple):
+    state: Optional[str]
+    data: Dict[str, Any]
+
+
+EMPTY_RECORD = FSMRecord(None, {})
+
+
+def storage_key(key: StorageKey) -> str:
+    return (f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+            f"{key.business_connection_id or ''}:{key.destiny}")
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM в таблице fsm_states.
+
+    Чтение идёт из кэша в памяти, а изменения копятся и записываются в
+    базу пачками в фоне, поэтому update_data в цикле вопросов не ждёт
+    записи на диск. Состояния переживают перезапуск бота; при аварийной
+    остановке теряются только изменения за последний интервал записи.
+    """
+
+    def __init__(self, database: Database = db) -> None:
+        self.db = database
+        self._cache: OrderedDict[str, FSMRecord] = OrderedDict()
+        # Изменения, ещё не записанные в базу
+        self._pending: dict[str, FSMRecord] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        # Будит фоновую запись раньше интервала, когда изменений накопилось много
+        self._flush_now = asyncio.Event()
+
+    async def _get(self, key: StorageKey) -> FSMRecord:
+        name = storage_key(key)
+        record = self._pending.get(name)
+        if record is None:
+            record = self._cache.get(name)
+        if record is not None:
+            self._remember(name, record)
+            return record
+
+        row = await self.db.fetchone("SELECT state, data FROM fsm_states WHERE key = ?", (name,))
+        record = FSMRecord(row[0], orjson.loads(row[1]) if row[1] else {}) if row else EMPTY_RECORD
+        # Запись могла измениться, пока шёл запрос
+        record = self._pending.get(name, record)
+        self._remember(name, record)
+        return record
+
+    def _remember(self, name: str, record: FSMRecord) -> None:
+        self._cache[name] = record
+        self._cache.move_to_end(name)
+        if len(self._cache) > MAX_CACHED_RECORDS:
+            self._cache.popitem(last=False)
+
+    def _put(self, key: StorageKey, record: FSMRecord) -> None:
+        name = storage_key(key)
+        self._remember(name, record)
+        self._pending[name] = record
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+        if len(self._pending) >= FSM_FLUSH_THRESHOLD:
+            self._flush_now.set()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get(key)
+        self._put(key, FSMRecord(state.state if isinstance(state, State) else state, record.data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._get(key)
+        self._put(key, FSMRecord(record.state, data.copy()))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get(key)).data.copy()
+
+    async def flush(self) -> None:
+        """Записывает накопленные изменения одной транзакцией."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            # Записи остаются в _pending до коммита, чтобы _get не прочитал из базы старую версию
+            batch = dict(self._pending)
+
+            statements = []
+            for name, record in batch.items():
+                if record.state is None and not record.data:
+                    statements.append((DELETE_SQL, (name,)))  # Пустые записи не храним
+                    continue
+                try:
+                    statements.append((UPSERT_SQL, (name, record.state, orjson.dumps(record.data).decode())))
+                except TypeError as e:
+                    logging.error(f"FSM data for {name} is not serializable: {e}")
+
+            try:
+                await self.db.write_all(statements)
+            except Exception as e:
+                # Записи остались в _pending и попадут в следующую пачку
+                logging.error(f"Database error while saving FSM states: {e!r}")
+                return
+            # Убираем записанное, если запись не успели изменить ещё раз
+            for name, record in batch.items():
+                if self._pending.get(name) is record:
+                    del self._pending[name]
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), FSM_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"FSM flush failed: {e!r}")
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
@@ -6,8 +6,11 @@ from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import KeyboardButton, ReplyKeyboardMarkup
 
-from shared import dp, Form, DB_FILE, create_connection, is_command, update_learned_topics_count, \
-    update_learned_words_count
+from cache import topic_changed, topic_list_changed
+from database import db
+from functions.leaderboard import refresh_leaderboard
+from functions.user_profiles import count_changed
+from shared import dp, Form, is_command
 
 add_topic_router = Router()
 
@@ -51,9 +54,6 @@ async def process_add_topic(message: types.Message, state: FSMContext) -> None:
 
         await add_user_topic(author_id, content, 0)
 
-        # Обновляем количество тем после добавления
-        await update_learned_topics_count(author_id)
-
         kb = [
             [KeyboardButton(text="Добавить тему"), KeyboardButton(text="Добавить слова")],
             [KeyboardButton(text="🔙Назад")]
@@ -81,43 +81,32 @@ async def go_back(message: types.Message, state: FSMContext) -> None:
 
 
 async def is_topic_exists(author_id: int, content: str) -> bool:
-    conn = create_connection(DB_FILE)
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM topics WHERE author_id = ? AND content = ?", (author_id, content))
-        return cursor.fetchone() is not None
+        return await db.fetchone("SELECT id FROM topics WHERE author_id = ? AND content = ?", (author_id, content)) is not None
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
         return False
-    finally:
-        conn.close()
 
 
 async def add_user_topic(author_id: int, content: str, visible: int) -> None:
-    conn = create_connection(DB_FILE)
     try:
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO topics (author_id, content, visible) VALUES (?, ?, ?)",
+        await db.write("INSERT INTO topics (author_id, content, visible) VALUES (?, ?, ?)",
                        (author_id, content, visible))
-        conn.commit()
+        topic_list_changed()
+        await count_changed(author_id, topics=1)
     except sqlite3.Error as e:
         logging.error(f"Ошибка базы данных при добавлении темы: {e}")
-    finally:
-        conn.close()
 
 
 # Функция для добавления слова в выбранную тему
 async def add_word_to_user_topic(user_id: int, topic_id: int, word: str, translation: str, state: FSMContext) -> None:
-    conn = create_connection(DB_FILE)
     try:
-        cursor = conn.cursor()
-        cursor.execute("""INSERT INTO user_dictionary (user_id, topic_id, word, translation)
-                          VALUES (?, ?, ?, ?)
-                       """, (user_id, topic_id, word, translation))
-        await update_learned_words_count(user_id)
-        conn.commit()
+        await db.write("""INSERT INTO user_dictionary (user_id, topic_id, word, translation)
+                            VALUES (?, ?, ?, ?)
+                         """, (user_id, topic_id, word, translation))
+        topic_changed(topic_id)
+        await refresh_leaderboard(user_id, await count_changed(user_id, words=1))
         await state.clear()
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
-    finally:
-        conn.close()
+
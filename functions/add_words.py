@@ -1,37 +1,35 @@
 import logging
 import sqlite3
-from sqlite3 import Connection
+import tempfile
 
 from aiogram import F, types, Bot, Router
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
 
+from callbacks import NS, callback_handler, pack
+from cache import topic_changed, topic_list_changed
+from functions.inline_results import ADD_WORDS_TOPICS, TOPIC_RESULTS_CACHE_TIME, cached_inline_results
+from functions.leaderboard import LEADERBOARD, refresh_leaderboard
 from functions.start_command import get_user_id_by_referral_code
-from shared import is_command, update_learned_words_count, update_learned_topics_count, TOKEN
-from shared import DB_FILE, Form, create_connection
-from token_of_bot import API_TOKEN
-
-from aiogram.client.session.aiohttp import AiohttpSession
-
-session = AiohttpSession(proxy="http://proxy.server:3128")
-bot = Bot(token=TOKEN, session=session)
+from functions.topic_search import search_topics
+from functions.word_export import EXPORT_FORMATS, start_export, stop_exports
+from functions.word_import import import_words, parse_csv, parse_lines
+from functions.topic_cards import get_topic_card
+from functions.user_profiles import count_changed, forget_profiles, save_profile
+from outbound import send_in_background
+from shared import is_command
+from shared import Form
+from database import db
 
 add_words_router = Router()
+add_words_router.shutdown.register(stop_exports)
 global topic_id
 
 # Функция для поиска тем пользователя
 async def search_user_topics(user_id: int, query: str) -> list:
-    conn = create_connection(DB_FILE)
     try:
-        cursor = conn.cursor()
-
-        cursor.execute("""SELECT id, content 
-                          FROM topics 
-                          WHERE (author_id = ? OR visible = 1) 
-                          AND content LIKE ?""", (user_id, f"%{query}%"))
-
-        results = cursor.fetchall()
+        results = await search_topics(user_id, query)
 
         # Логируем результаты поиска
         logging.info(f"Found topics: {results}")
@@ -40,8 +38,6 @@ async def search_user_topics(user_id: int, query: str) -> list:
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
         return []
-    finally:
-        conn.close()
 
 # Обработка команды "Добавить слова"
 @add_words_router.message(F.text == "Добавить слова", StateFilter(None))
@@ -56,19 +52,14 @@ async def add_words_prompt(message: types.Message, state: FSMContext) -> None:
 
 
 @add_words_router.inline_query(F.query.startswith("поиск темы для добавления слов: "))
-async def inline_query_handler(inline_query: types.InlineQuery) -> None:
+async def inline_query_handler(inline_query: types.InlineQuery, bot: Bot) -> None:
     logging.info(f"inline_query_handler {inline_query.from_user.id}")
-    query = inline_query.query[len("поиск темы для добавления слов: "):].strip()
+    query = inline_query.query[len("поиск темы для добавления слов: "):]
     user_id = inline_query.from_user.id
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    try:
-        # Поиск тем по запросу
-        cursor.execute("""SELECT id, content
-                          FROM topics
-                          WHERE (author_id = ? OR visible = 1) AND content LIKE ?""",
-                       (user_id, f'%{query}%'))
-        results = cursor.fetchall()
+
+    async def build(query: str) -> list:
+        # Поиск тем по запросу: свои темы первыми, не больше 50 результатов
+        results = await search_topics(user_id, query)
 
         items = [
             InlineQueryResultArticle(
@@ -89,15 +80,19 @@ async def inline_query_handler(inline_query: types.InlineQuery) -> None:
                     input_message_content=InputTextMessageContent(message_text="Не найдено тем по вашему запросу.")
                 )
             ]
+        return items
+
+    try:
+        # Готовые результаты живут в памяти до создания или удаления темы
+        items = await cached_inline_results(ADD_WORDS_TOPICS, user_id, query, build)
 
-        # Отправка результатов
-        await bot.answer_inline_query(inline_query.id, results=items)
+        # Отправка результатов: у каждого пользователя свои темы, Telegram кэширует их ненадолго
+        await bot.answer_inline_query(inline_query.id, results=items, cache_time=TOPIC_RESULTS_CACHE_TIME,
+                                      is_personal=True)
 
     except sqlite3.OperationalError as e:
         logging.error(f"Database error: {e}")
         await bot.answer_inline_query(inline_query.id, results=[])
-    finally:
-        conn.close()
 
 
 @add_words_router.message(lambda message: message.text.startswith("Вы выбрали тему:"), StateFilter(None))
@@ -106,47 +101,19 @@ async def process_topic_selection(message: types.Message, state: FSMContext) ->
     logging.info(f"process_topic_selection {message.from_user.id}")
     topic_name = message.text.split(": ", 1)[-1]
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
     try:
-        # Получаем ID темы и её детали
-        cursor.execute("SELECT id, visible, author_id FROM topics WHERE content = ?", (topic_name,))
-        topic = cursor.fetchone()
-
-        if topic:
-            topic_id, is_visible, author_id = topic
-            cursor.execute("SELECT COUNT(*) FROM user_dictionary WHERE topic_id = ?", (topic_id,))
-            word_count = cursor.fetchone()[0]
-
-            # Получаем информацию об авторе
-            cursor.execute("SELECT full_name FROM users WHERE user_id = ?", (author_id,))
-            author = cursor.fetchone()
-            author_name = author[0] if author else "Неизвестный автор"
-            author_link = f"[{author_name}](tg://user?id={author_id})"
-
-            message_text = (f"Название темы: *{topic_name}*\n"
-                            f"Количество слов: {word_count}\n"
-                            # f"Статус: {'Публичная' if is_visible else 'Приватная'}\n"
-                            f"Автор: {author_link}")
-
-            # Создаём клавиатуру с действиями
-            kb = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="Добавить слово", callback_data=f"add_words:{topic_id}"),
-                 InlineKeyboardButton(text="Удалить тему", callback_data=f"delete_topic:{topic_id}")],
-                [InlineKeyboardButton(text="Слова в теме", callback_data=f"show_words:{topic_id}")],
-                # [InlineKeyboardButton(text="Сделать приватной" if is_visible else "Сделать публичной",
-                #                       callback_data=f"toggle_visibility:{topic_id}")]
-            ])
-            await message.answer(message_text, parse_mode='Markdown', reply_markup=kb)
+        # Карточка темы (тема, автор и число слов) из кэша или одним запросом
+        card = await get_topic_card(topic_name)
+
+        if card:
+            topic_id = card.topic_id
+            await message.answer(card.text, parse_mode='Markdown', reply_markup=card.manage_markup)
             await state.clear()
         else:
             await message.answer("Тема не найдена.")
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
         await message.answer("Произошла ошибка при получении данных.")
-    finally:
-        conn.close()
 
 
 # @add_words_router.callback_query(F.data.startswith("toggle_visibility:"))
@@ -210,56 +177,25 @@ async def process_topic_selection(message: types.Message, state: FSMContext) ->
 
 
 
-# Функция для добавления или обновления пользователя в базе данных
-async def upsert_user(user_id: int, username_tg: str, full_name: str, referral_code: str = None,
-                      balance: int = 0, elite_status: str = 'No', learned_words_count: int = 0,
-                      elite_start_date: str = None) -> None:
-    conn = create_connection(DB_FILE)
-    try:
-        cursor = conn.cursor()
-
-        # Генерация уникального реферального кода
-        unique_referral_code = str(user_id)  # Можно изменить на более сложную генерацию
-
-        # Если реферальный код указан, проверяем и обновляем `referred_by`
-        referred_by_id = None
-        if referral_code:
-            referred_by_id = get_user_id_by_referral_code(referral_code)
-
-        cursor.execute("""INSERT INTO users (user_id, username_tg, full_name, balance, elite_status, learned_words_count, referral_code, referred_by, elite_start_date)
-                          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                          ON CONFLICT(user_id) DO UPDATE SET
-                              username_tg = excluded.username_tg,
-                              full_name = excluded.full_name,
-                              balance = excluded.balance,
-                              elite_status = excluded.elite_status,
-                              learned_words_count = excluded.learned_words_count,
-                              referral_code = excluded.referral_code,
-                              referred_by = excluded.referred_by,
-                              elite_start_date = excluded.elite_start_date
-                       """, (
-        user_id, username_tg, full_name, balance, elite_status, learned_words_count, unique_referral_code,
-        referred_by_id, elite_start_date))
-        conn.commit()
-    except sqlite3.Error as e:
-        logging.error(f"Database error: {e}")
-    finally:
-        conn.close()
+# Функция для добавления пользователя или обновления его имени; счётчики и статус не перезаписываются
+async def upsert_user(user_id: int, username_tg: str, full_name: str, referral_code: str = None) -> bool:
+    # Если реферальный код указан, запоминаем пригласившего
+    referred_by_id = None
+    if referral_code:
+        referred_by_id = await get_user_id_by_referral_code(referral_code)
+    return await save_profile(user_id, username_tg, full_name, referred_by_id)
 
 
 
 
-@add_words_router.callback_query(lambda c: c.data.startswith("add_words:"))
-async def add_words_callback(callback_query: types.CallbackQuery, state: FSMContext):
+@callback_handler(NS.ADD_WORDS)
+async def add_words_callback(callback_query: types.CallbackQuery, state: FSMContext, callback_args: tuple):
     logging.info(f"add_words_callback {callback_query.from_user.id}")
-    topic_id = callback_query.data.split(":")[1]
+    topic_id, = callback_args
     user_id = callback_query.from_user.id
 
     # Получаем название темы из базы данных
-    conn = create_connection(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT content FROM topics WHERE id = ?", (topic_id,))
-    topic_name = cursor.fetchone()
+    topic_name = await db.fetchone("SELECT content FROM topics WHERE id = ?", (topic_id,))
 
     if topic_name:
         topic_name = topic_name[0]  # Получаем строку из кортежа
@@ -288,20 +224,13 @@ async def handle_word_input(message: types.Message, state: FSMContext) -> None:
 
 # Функция для добавления слова в выбранную тему
 async def add_word_to_user_topic(user_id: int, topic_id: int, word: str, translation: str) -> None:
-    conn = create_connection(DB_FILE)
     try:
-        cursor = conn.cursor()
-        cursor.execute("""INSERT INTO user_dictionary (user_id, topic_id, word, translation)
-                          VALUES (?, ?, ?, ?)""", (user_id, topic_id, word, translation))
-
-        # Обновляем количество изученных слов
-        await update_learned_words_count(user_id)
-
-        conn.commit()
+        await db.write("""INSERT INTO user_dictionary (user_id, topic_id, word, translation)
+                            VALUES (?, ?, ?, ?)""", (user_id, topic_id, word, translation))
+        topic_changed(topic_id)
+        await refresh_leaderboard(user_id, await count_changed(user_id, words=1))
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
-    finally:
-        conn.close()
 
 # Обработка текста для добавления перевода
 @add_words_router.message(Form.waiting_for_translation)
@@ -323,72 +252,145 @@ async def process_translation(message: types.Message, state: FSMContext) -> None
     if is_command(translation):
         await message.answer("Вы не можете использовать названия команд в качестве аргументов.")
         return
-    await update_learned_words_count(user_id)
     await add_word_to_user_topic(user_id, topic_id, word, translation)
     await state.clear()  # Очищаем состояние после добавления
-    await update_learned_words_count(user_id)
     message_text = f'Слово *"{word}"* с переводом *"{translation}"* успешно добавлено в тему *"{topic_name}"*!'
-    await message.answer(message_text, parse_mode='Markdown')
+    send_in_background(message.answer(message_text, parse_mode='Markdown'))
+
+
+@callback_handler(NS.IMPORT_WORDS)
+async def import_words_callback(callback_query: types.CallbackQuery, state: FSMContext, callback_args: tuple):
+    logging.info(f"import_words_callback {callback_query.from_user.id}")
+    topic_id, = callback_args
+
+    topic_name = await db.fetchval("SELECT content FROM topics WHERE id = ?", (topic_id,))
 
+    if topic_name:
+        await state.update_data(selected_topic_id=topic_id, selected_topic_name=topic_name)
+        await callback_query.message.answer(
+            "Отправьте список слов, по одному на строку, в формате:\n"
+            "<code>слово - перевод</code>\n\n"
+            "Или пришлите файл CSV/TSV: в первом столбце слово, во втором перевод.",
+            parse_mode='HTML')
+        await state.set_state(Form.waiting_for_import)
+    else:
+        await callback_query.answer("Тема не найдена.")
+
+
+# Обработка списка слов или файла для импорта
+@add_words_router.message(Form.waiting_for_import, F.text | F.document)
+async def process_import(message: types.Message, state: FSMContext, bot: Bot) -> None:
+    logging.info(f"process_import {message.from_user.id}")
+    user_id = message.from_user.id
+    data = await state.get_data()
+    topic_id = data.get('selected_topic_id')
+    topic_name = data.get('selected_topic_name')
 
-@add_words_router.callback_query(lambda c: c.data.startswith("delete_topic:"))
-async def delete_topic_callback(callback_query: types.CallbackQuery):
+    if message.text and is_command(message.text):
+        await message.answer("Вы не можете использовать названия команд в качестве аргументов.")
+        return
+
+    try:
+        if message.document:
+            # Файл скачивается во временный файл и читается построчно
+            with tempfile.TemporaryFile() as file:
+                await bot.download(message.document, destination=file)
+                file.seek(0)
+                result = await import_words(user_id, topic_id, parse_csv(file))
+        else:
+            result = await import_words(user_id, topic_id, parse_lines(message.text.splitlines()))
+    except sqlite3.Error as e:
+        logging.error(f"Database error: {e}")
+        await message.answer("Произошла ошибка при импорте слов.")
+        return
+
+    if result is None:
+        await state.clear()
+        await message.answer("Тема не найдена.")
+        return
+
+    if not result.added and not result.skipped:
+        await message.answer("Не удалось найти слова. Каждая строка должна быть в формате «слово - перевод».")
+        return
+
+    await state.clear()
+    if result.added:
+        topic_changed(topic_id)
+        await refresh_leaderboard(user_id, await count_changed(user_id, words=result.added))
+
+    text = f'В тему *"{topic_name}"* добавлено слов: {result.added}.'
+    if result.skipped:
+        text += f"\nПропущено (уже есть в теме): {result.skipped}."
+    await message.answer(text, parse_mode='Markdown')
+
+
+@callback_handler(NS.EXPORT_TOPIC)
+async def export_topic_callback(callback_query: types.CallbackQuery, bot: Bot, callback_args: tuple):
+    logging.info(f"export_topic_callback {callback_query.from_user.id}")
+    topic_id, export_format = callback_args
+
+    topic = await db.fetchone("SELECT content, word_count FROM topics WHERE id = ?", (topic_id,))
+
+    if not topic:
+        await callback_query.answer("Тема не найдена.")
+    elif not topic[1]:
+        await callback_query.answer("В этой теме нет слов.", show_alert=True)
+    elif export_format not in EXPORT_FORMATS:
+        await callback_query.answer("Неизвестный формат.")
+    else:
+        # Файл готовится в фоне и приходит отдельным сообщением
+        start_export(bot, callback_query.from_user.id, topic_id, topic[0], export_format)
+        await callback_query.answer("Готовим файл, он придёт через несколько секунд.")
+
+
+@callback_handler(NS.DELETE_TOPIC)
+async def delete_topic_callback(callback_query: types.CallbackQuery, callback_args: tuple):
     logging.info(f"delete_topic_callback {callback_query.from_user.id}")
-    topic_id = callback_query.data.split(":")[1]
+    topic_id, = callback_args
     user_id = callback_query.from_user.id
 
     # Получаем название темы для подтверждения
-    conn = create_connection(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT content FROM topics WHERE id = ?", (topic_id,))
-    topic = cursor.fetchone()
+    topic = await db.fetchone("SELECT content FROM topics WHERE id = ?", (topic_id,))
 
     if topic:
         topic_name = topic[0]
 
         # Предлагаем подтвердить удаление
         kb = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="Да", callback_data=f"confirm_delete:{topic_id}"),
-             InlineKeyboardButton(text="Нет", callback_data="cancel_delete")]
+            [InlineKeyboardButton(text="Да", callback_data=pack(NS.CONFIRM_DELETE, topic_id)),
+             InlineKeyboardButton(text="Нет", callback_data=pack(NS.CANCEL_DELETE))]
         ])
         await callback_query.message.answer(f'Вы уверены, что хотите удалить тему "{topic_name}" и все связанные с ней слова?',
                                     reply_markup=kb)
     else:
         await callback_query.answer("Тема не найдена.")
-    conn.close()
 
 
-@add_words_router.callback_query(lambda c: c.data.startswith("confirm_delete:"))
-async def confirm_delete_topic(callback_query: types.CallbackQuery):
+@callback_handler(NS.CONFIRM_DELETE)
+async def confirm_delete_topic(callback_query: types.CallbackQuery, callback_args: tuple):
     logging.info(f"confirm_delete_topic {callback_query.from_user.id}")
-    topic_id = callback_query.data.split(":")[1]
-    user_id = callback_query.from_user.id
-    conn = create_connection(DB_FILE)
-    cursor = conn.cursor()
-    await update_learned_words_count(user_id)
-    await update_learned_topics_count(user_id)
+    topic_id, = callback_args
     try:
-        # Удаляем все слова, связанные с темой
-        cursor.execute("DELETE FROM user_dictionary WHERE topic_id = ?", (topic_id,))
-
-        # Удаляем тему
-        cursor.execute("DELETE FROM topics WHERE id = ?", (topic_id,))
-        conn.commit()
+        # Слова темы и саму тему удаляем атомарно
+        await db.write_all([
+            ("DELETE FROM user_dictionary WHERE topic_id = ?", (topic_id,)),
+            ("DELETE FROM topics WHERE id = ?", (topic_id,)),
+        ])
 
+        topic_changed(topic_id)
+        topic_list_changed()
+        # Счётчики уменьшились у автора и у всех, у кого были слова в теме
+        forget_profiles()
+        # Триггеры уменьшили счётчики всех, у кого были слова в теме, а не только автора:
+        # таблица лидеров перечитается из базы при следующем показе
+        LEADERBOARD.reset()
         await callback_query.message.answer("Тема и все связанные слова успешно удалены.")
-        await update_learned_words_count(user_id)
-        await update_learned_topics_count(user_id)
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
         await callback_query.message.answer("Произошла ошибка при удалении темы.")
-    finally:
-        conn.close()
 
 
-@add_words_router.callback_query(lambda c: c.data == "cancel_delete")
+@callback_handler(NS.CANCEL_DELETE)
 async def cancel_delete_topic(callback_query: types.CallbackQuery):
     logging.info(f"cancel_delete_topic {callback_query.from_user.id}")
     await callback_query.message.answer("Удаление темы отменено.")
-    user_id = callback_query.from_user.id
-    await update_learned_words_count(user_id)
-    await update_learned_topics_count(user_id)
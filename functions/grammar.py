@@ -1,18 +1,17 @@
 import logging
-import sqlite3
-from uuid import uuid4
-import random
+from types import MappingProxyType
+from typing import Mapping
 
-from aiogram import types, F, Bot, Router
+from aiogram import types, F, Router
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, InlineQueryResultArticle, InputTextMessageContent, \
     ReplyKeyboardMarkup, KeyboardButton
-from shared import DB_FILE, TOKEN, TranslationStates
-from aiogram.client.session.aiohttp import AiohttpSession
-
-session = AiohttpSession(proxy="http://proxy.server:3128")
-bot = Bot(token=TOKEN, session=session)
+from callbacks import LEGACY_CALLBACKS, NS, callback_handler, pack
+from database import db
+from functions import irregular_verbs
+from functions.inline_results import IRREGULAR_VERBS, VERB_RESULTS_CACHE_TIME, cached_inline_results
+from shared import TranslationStates
 
 logging.basicConfig(level=logging.INFO)
 grammar_router = Router()
@@ -23,20 +22,20 @@ async def grammar(message: types.Message, state: FSMContext) -> None:
     logging.info(f"grammar {message.from_user.id}")
     await state.clear()  # Сбрасываем состояние
     kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Irregular Verbs", callback_data="irregular_verbs"),
-         InlineKeyboardButton(text="Таблица Времен", callback_data="time_select")]
+        [InlineKeyboardButton(text="Irregular Verbs", callback_data=pack(NS.IRREGULAR_VERBS)),
+         InlineKeyboardButton(text="Таблица Времен", callback_data=pack(NS.TIME_SELECT))]
     ])
     await message.answer("Выберите тему по грамматике:", reply_markup=kb)
 
 
 # Обработчик callback запроса для "Irregular Verbs"
-@grammar_router.callback_query(F.data == "irregular_verbs")
+@callback_handler(NS.IRREGULAR_VERBS)
 async def handle_irregular_verbs(callback_query: types.CallbackQuery, state: FSMContext):
     logging.info(f"handle_irregular_verbs {callback_query.from_user.id}")
     command = "введите глагол в форме Infinitive: "  # Определяем команду
     kb = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Неправильные глаголы", switch_inline_query_current_chat=command)],
-        [InlineKeyboardButton(text="Продолжи ряд", callback_data="continue_series")],
+        [InlineKeyboardButton(text="Продолжи ряд", callback_data=pack(NS.CONTINUE_SERIES))],
     ])
     await callback_query.message.answer(
         "Вы выбрали тему: Неправильные глаголы.\nПожалуйста, введите глагол в форме инфинитива:",
@@ -45,57 +44,49 @@ async def handle_irregular_verbs(callback_query: types.CallbackQuery, state: FSM
     await callback_query.answer()  # Подтверждаем callback
 
 
+# Индекс глаголов загружается в память при старте бота
+grammar_router.startup.register(irregular_verbs.load_verb_index)
+
+
+# Функция для построения результатов поиска неправильных глаголов
+async def build_verb_results(query_text: str) -> list:
+    # Поиск по всем формам глагола и переводам, совпадения по началу слова идут первыми
+    results = irregular_verbs.VERB_INDEX.search(query_text, limit=50)
+
+    items = [
+        InlineQueryResultArticle(
+            id=f"verb_{verb.v1}",
+            title=verb.infinitive,
+            description=f"{verb.v2_first} — {verb.v3_first} — {', '.join(verb.translations)}",
+            input_message_content=InputTextMessageContent(
+                message_text=f"Глагол: {verb.infinitive}"
+            )
+        )
+        for verb in results
+    ]
+
+    if not items:
+        items = [
+            InlineQueryResultArticle(
+                id="no_results",
+                title="Нет доступных глаголов",
+                input_message_content=InputTextMessageContent(message_text="Не найдено.")
+            )
+        ]
+    return items
+
+
 # Обработчик инлайн-запроса
 @grammar_router.inline_query(lambda query: query.query.startswith("введите глагол в форме Infinitive: "))
 async def inline_query_handler_irregular(inline_query: types.InlineQuery) -> None:
     logging.info(f"inline_query_handler_irregular {inline_query.from_user.id}")
     command_prefix = "введите глагол в форме Infinitive: "
-    query_text = inline_query.query[len(command_prefix):].strip()
-
-    try:
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            # Поиск по инфинитиву или второму инфинитиву
-            cursor.execute("""
-                SELECT v1, v1_second, v2_first, v2_second, v3_first, v3_second, 
-                       first_translation, second_translation, third_translation
-                FROM irregular_verbs
-                WHERE v1 LIKE ? OR v1_second LIKE ?
-                LIMIT 50
-                """, (f'%{query_text}%', f'%{query_text}%'))
-            results = cursor.fetchall()
-
-        items = []
-        items = items[:50]
-        for item in results:
-            # Генерация уникального ID для каждого результата
-            result_id = str(uuid4())
-            title = item[0] if item[0] else 'Unknown Verb'  # Используем v1 как заголовок
-            items.append(
-                InlineQueryResultArticle(
-                    id=result_id,
-                    title=title,
-                    input_message_content=InputTextMessageContent(
-                        message_text=f"Глагол: {item[0]}"
-                    )
-                )
-            )
-
-        if not items:
-            items = [
-                InlineQueryResultArticle(
-                    id="no_results",
-                    title="Нет доступных глаголов",
-                    input_message_content=InputTextMessageContent(message_text="Не найдено.")
-                )
-            ]
+    query_text = inline_query.query[len(command_prefix):]
+    # Результаты одинаковы для всех пользователей и не устаревают
+    items = await cached_inline_results(IRREGULAR_VERBS, None, query_text, build_verb_results)
 
-        # Отправка результатов инлайн-запроса
-        await inline_query.answer(results=items, cache_time=1)
-
-    except sqlite3.OperationalError as e:
-        logging.error(f"Database error: {e}")
-        await inline_query.answer(results=[])
+    # Отправка результатов инлайн-запроса: Telegram может отдавать их из своего кэша
+    await inline_query.answer(results=items, cache_time=VERB_RESULTS_CACHE_TIME)
 
 
 # Обработчик сообщения после выбора глагола
@@ -105,77 +96,12 @@ async def process_topic_selection_repeat(message: types.Message, state: FSMConte
     await state.clear()
     verb_name = message.text.split(": ", 1)[-1].strip()
 
-    try:
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            # Поиск глагола по v1 или v1_second
-            cursor.execute("""
-                SELECT v1, v1_second, v2_first, v2_second, v3_first, v3_second, 
-                       first_translation, second_translation, third_translation
-                FROM irregular_verbs
-                WHERE v1 = ? OR v1_second = ?
-            """, (verb_name, verb_name))
-            verb = cursor.fetchone()
-
-        if verb:
-            # Разделяем полученные данные
-            v1, v1_second, v2_first, v2_second, v3_first, v3_second, first_translation, second_translation, third_translation = verb
-
-            parts = []
-
-            # Инфинитив
-            if v1 and v1_second:
-                infinitive = f"{v1} / {v1_second}"
-            elif v1:
-                infinitive = v1
-            else:
-                infinitive = "Неизвестно"
-            parts.append(f"*Infinitive:* {infinitive}")
-
-            # Past Simple
-            if v2_first and v2_second:
-                past_simple = f"{v2_first} / {v2_second}"
-            elif v2_first:
-                past_simple = v2_first
-            else:
-                past_simple = "Неизвестно"
-            parts.append(f"*Past Simple:* {past_simple}")
-
-            # Past Participle
-            if v3_first and v3_second:
-                past_participle = f"{v3_first} / {v3_second}"
-            elif v3_first:
-                past_participle = v3_first
-            else:
-                past_participle = "Неизвестно"
-            parts.append(f"*Past Participle:* {past_participle}")
-
-            # Переводы
-            translations = []
-            if first_translation:
-                translations.append(first_translation)
-            if second_translation:
-                translations.append(second_translation)
-            if third_translation:
-                translations.append(third_translation)
-            if len(translations) > 1:
-                translations_text = ", ".join(translations)
-                parts.append(f"*Translations:* {translations_text}")
-            if len(translations) == 1:
-                translations_text = ", ".join(translations)
-                parts.append(f"*Translation:* {translations_text}")
-            # Объединяем все части в одно сообщение
-
-            message_text = "\n".join(parts)
-
-            # Отправляем сообщение пользователю
-            await message.answer(message_text, parse_mode='Markdown')
-        else:
-            await message.answer("Глагол не найден.")
-
-    except sqlite3.Error as e:
-        logging.error(f"Database error: {e}")
-        await message.answer("Произошла ошибка при получении данных.")
+    # Карточка глагола уже сформирована при загрузке индекса
+    card = irregular_verbs.VERB_INDEX.card(verb_name)
+    if card:
+        await message.answer(card, parse_mode='Markdown')
+    else:
+        await message.answer("Глагол не найден.")
 
 
 @grammar_router.message(F.text == "Прекратить")
@@ -194,22 +120,21 @@ async def stop_iv(message: types.Message, state: FSMContext):
     await message.answer("Вы вернулись в главное меню.", reply_markup=keyboard)
 
 
-# Функция для получения случайного глагола
-async def get_random_verb():
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT v1, v1_second, v2_first, v2_second, v3_first, v3_second, first_translation, second_translation, third_translation FROM irregular_verbs")
-        verbs = cursor.fetchall()
-        if verbs:
-            return random.choice(verbs)
-    return None
+# Веса ошибок пользователей накапливаются в памяти и записываются в базу пакетами
+grammar_router.startup.register(irregular_verbs.start_mistakes_flusher)
+grammar_router.shutdown.register(irregular_verbs.stop_mistakes_flusher)
 
 
-@grammar_router.callback_query(F.data == "continue_series")
+# Функция для получения следующего глагола из колоды пользователя
+async def get_next_verb(user_id: int):
+    verb = await irregular_verbs.draw_verb(user_id)
+    return tuple(verb) if verb else None
+
+
+@callback_handler(NS.CONTINUE_SERIES)
 async def continue_series(message_or_callback_query, state: FSMContext):
     logging.info(f"continue_series {message_or_callback_query.from_user.id}")
-    verb_data = await get_random_verb()
+    verb_data = await get_next_verb(message_or_callback_query.from_user.id)
     if not verb_data:
         await message_or_callback_query.answer("Нет доступных глаголов в базе данных.")
         return
@@ -238,7 +163,7 @@ async def continue_series(message_or_callback_query, state: FSMContext):
 async def ask_past_simple(message: types.Message, state: FSMContext):
     data = await state.get_data()
     verb_data = data.get('verb_data')
-    if ask_past_simple.text == "Прекратить":
+    if message.text == "Прекратить":
         return await stop_iv(message, state)
     if not verb_data:
         await message.answer("Нет данных о глаголе.")
@@ -247,7 +172,10 @@ async def ask_past_simple(message: types.Message, state: FSMContext):
     v2_first, v2_second = verb_data[2], verb_data[3]
     user_input = message.text.strip()
 
-    if user_input in [v2_first, v2_second]:
+    correct = user_input in [v2_first, v2_second]
+    irregular_verbs.record_verb_answer(message.from_user.id, verb_data[0], correct)
+
+    if correct:
         kb = [
             [KeyboardButton(text="Прекратить")]
         ]
@@ -270,7 +198,7 @@ async def ask_past_participle(message: types.Message, state: FSMContext):
     data = await state.get_data()
     verb_data = data.get('verb_data')
     infinitive = verb_data[0] or verb_data[1]
-    if ask_past_participle.text == "Прекратить":
+    if message.text == "Прекратить":
         return await stop_iv(message, state)
     if not verb_data:
         await message.answer("Нет данных о глаголе.")
@@ -279,7 +207,10 @@ async def ask_past_participle(message: types.Message, state: FSMContext):
     v3_first, v3_second = verb_data[4], verb_data[5]
     user_input = message.text.strip()
 
-    if user_input in [v3_first, v3_second]:
+    correct = user_input in [v3_first, v3_second]
+    irregular_verbs.record_verb_answer(message.from_user.id, verb_data[0], correct)
+
+    if correct:
         kb = [
             [KeyboardButton(text="Прекратить")]
         ]
@@ -306,13 +237,16 @@ async def check_translation(message: types.Message, state: FSMContext):
     correct_translation = data.get('correct_translation')
     verb_data = data.get('verb_data')
     user_input = message.text.strip()
-    if check_translation.text == "Прекратить":
+    if message.text == "Прекратить":
         return await stop_iv(message, state)
     # Составляем список правильных переводов
     correct_translations = [correct_translation] + [t for t in verb_data[6:] if t]
 
+    correct = user_input in correct_translations
+    irregular_verbs.record_verb_answer(message.from_user.id, verb_data[0], correct)
+
     # Если перевод правильный
-    if user_input in correct_translations:
+    if correct:
         infinitive = verb_data[0] or verb_data[1]
         v2_first = verb_data[2]
         v2_second = verb_data[3]
@@ -371,465 +305,96 @@ async def check_translation(message: types.Message, state: FSMContext):
     await continue_series(message, state)
 
 
-@grammar_router.callback_query(F.data == "time_select")
+@callback_handler(NS.TIME_SELECT)
 async def handle_type_time_select(callback_query: types.CallbackQuery, state: FSMContext):
     logging.info(f"handle_type_time_select {callback_query.from_user.id}")
     kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Active Voice", callback_data="select_active_voice"),
-         InlineKeyboardButton(text="Passive Voice", callback_data="select_passive_voice")
+        [InlineKeyboardButton(text="Active Voice", callback_data=pack(NS.ACTIVE_VOICE)),
+         InlineKeyboardButton(text="Passive Voice", callback_data=pack(NS.PASSIVE_VOICE))
         ]
     ])
     await callback_query.message.answer("Выберите время:", reply_markup=kb)
 
 
-@grammar_router.callback_query(F.data == "select_active_voice")
+@callback_handler(NS.ACTIVE_VOICE)
 async def handle_active_voice(callback_query: types.CallbackQuery, state: FSMContext):
     logging.info(f"handle_active_voice {callback_query.from_user.id}")
 
+    # Кнопки по четыре в ряд: Present, Past, Future, Future in the Past
     kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Present Simple", callback_data="active_present_simple"),
-         InlineKeyboardButton(text="Present Continuous", callback_data="active_present_continuous"),
-         InlineKeyboardButton(text="Present Perfect", callback_data="active_present_perfect"),
-         InlineKeyboardButton(text="Present Perfect Continuous", callback_data="active_present_perfect_continuous"),
-         ],
-        [InlineKeyboardButton(text="Past Simple", callback_data="active_past_simple"),
-         InlineKeyboardButton(text="Past Continuous", callback_data="active_past_continuous"),
-         InlineKeyboardButton(text="Past Perfect", callback_data="active_past_perfect"),
-         InlineKeyboardButton(text="Past Perfect Continuous", callback_data="active_past_perfect_continuous"),
-         ],
-        [InlineKeyboardButton(text="Future Simple", callback_data="active_future_simple"),
-         InlineKeyboardButton(text="Future Continuous", callback_data="active_future_continuous"),
-         InlineKeyboardButton(text="Future Perfect", callback_data="active_future_perfect"),
-         InlineKeyboardButton(text="Future Perfect Continuous", callback_data="active_future_perfect_continuous"),
-         ],
-        [InlineKeyboardButton(text="Future in the Past Simple", callback_data="active_future_in_the_past_simple"),
-         InlineKeyboardButton(text="Future in the Past Continuous", callback_data="active_future_in_the_past_continuous"),
-         InlineKeyboardButton(text="Future in the Past Perfect", callback_data="active_future_in_the_past_perfect"),
-         InlineKeyboardButton(text="Future in the Past Perfect Continuous",
-                              callback_data="active_future_in_the_past_perfect_continuous"),
-         ]
+        [InlineKeyboardButton(text=name, callback_data=pack(NS.TENSE, index))
+         for index, name in enumerate(ACTIVE_TENSES[row:row + 4], start=row)]
+        for row in range(0, len(ACTIVE_TENSES), 4)
     ])
 
     await callback_query.message.answer("Выберите время:", reply_markup=kb)
 
 
-@grammar_router.callback_query(F.data == "active_present_simple")
-async def handle_active_present_simple(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"handle_present_simple {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Present Simple'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_present_continuous")
-async def handle_active_present_continuous(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_present_continuous {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Present Continuous'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_present_perfect")
-async def handle_active_present_perfect(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_present_perfect {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Present Perfect'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_present_perfect_continuous")
-async def handle_active_present_perfect_continuous(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_present_perfect_continuous {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Present Perfect Continuous'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_past_simple")
-async def handle_active_past_simple(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_past_simple {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Past Simple'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_past_continuous")
-async def handle_active_past_continuous(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_past_continuous {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Past Continuous'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_past_perfect")
-async def handle_active_past_perfect(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_past_perfect {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Past Perfect'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_past_perfect_continuous")
-async def handle_active_past_perfect_continuous(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_past_perfect_continuous {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Past Perfect Continuous'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_future_simple")
-async def handle_active_future_simple(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_future_simple {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Future Simple'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_future_continuous")
-async def handle_active_future_continuous(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_future_continuous {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Future Continuous'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_future_perfect")
-async def handle_active_future_perfect(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_future_perfect {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Future Perfect'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_future_perfect_continuous")
-async def handle_active_future_perfect_continuous(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_future_perfect_continuous {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Future Perfect Continuous'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_future_in_the_past_simple")
-async def handle_active_future_in_the_past_simple(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_future_in_the_past_simple {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Future in the Past Simple'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_future_in_the_past_continuous")
-async def handle_active_future_in_the_past_continuous(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_future_in_the_past_continuous {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Future in the Past Continuous'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_future_in_the_past_perfect")
-async def handle_active_future_in_the_past_perfect(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_future_in_the_past_perfect {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Future in the Past Perfect'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
-
-@grammar_router.callback_query(F.data == "active_future_in_the_past_perfect_continuous")
-async def handle_active_future_in_the_past_perfect_continuous(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"active_future_in_the_past_perfect_continuous {callback_query.from_user.id}")
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM times WHERE time_name = 'Future in the Past Perfect Continuous'")
-        result = cursor.fetchone()
-        if result:
-            # Формируем сообщение с данными
-            message = (
-                f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
-                f"<b>Описание:</b> {result[2]}\n\n"  # description
-                f"<b>[ + ]:</b> {result[3]}\n"  # formula
-                f"<b>     Пример:</b> {result[4]}\n"  # example
-                f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
-                f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
-                f"<b>     Пример:</b> {result[7]}\n"  # example_negative
-                f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
-                f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
-                f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
-                f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
-            )
-            await callback_query.message.answer(message, parse_mode='HTML')
-        else:
-            await callback_query.message.answer("Данные не найдены.")
+# Каталог времён: callback_data ("active_present_simple") -> готовая HTML-карточка.
+# Загружается один раз при старте; после правки таблицы `times` бота нужно перезапустить.
+TENSE_CATALOG: Mapping[str, str] = MappingProxyType({})
+
+
+def tense_callback_data(time_name: str) -> str:
+    return "active_" + time_name.lower().replace(" ", "_")
+
+
+# Времена в порядке кнопок; в callback_data передаётся номер времени в этом списке
+ACTIVE_TENSES = (
+    "Present Simple", "Present Continuous", "Present Perfect", "Present Perfect Continuous",
+    "Past Simple", "Past Continuous", "Past Perfect", "Past Perfect Continuous",
+    "Future Simple", "Future Continuous", "Future Perfect", "Future Perfect Continuous",
+    "Future in the Past Simple", "Future in the Past Continuous", "Future in the Past Perfect",
+    "Future in the Past Perfect Continuous",
+)
+# Кнопки старого формата ("active_past_simple") в уже отправленных сообщениях
+LEGACY_CALLBACKS.update((tense_callback_data(name), pack(NS.TENSE, index)) for index, name in enumerate(ACTIVE_TENSES))
+
+
+def render_tense_card(result: tuple) -> str:
+    return (
+        f"<b>Время: {result[0]}</b> (<b>{result[1]}</b>)\n"  # translation_name
+        f"<b>Описание:</b> {result[2]}\n\n"  # description
+        f"<b>[ + ]:</b> {result[3]}\n"  # formula
+        f"<b>     Пример:</b> {result[4]}\n"  # example
+        f"<b>     Перевод:</b> {result[5]}\n\n"  # translation_example
+        f"<b>[ - ]:</b> {result[6]}\n"  # negative_formula
+        f"<b>     Пример:</b> {result[7]}\n"  # example_negative
+        f"<b>     Перевод:</b> {result[8]}\n\n"  # translation_example_negative
+        f"<b>[ ? ]:</b> {result[9]}\n"  # interrogative_formula
+        f"<b>     Пример:</b> {result[10]}\n"  # example_interrogative
+        f"<b>     Перевод:</b> {result[11]}"  # translation_example_interrogative
+    )
+
+
+# Функция для загрузки таблицы времён в память
+@grammar_router.startup()
+async def load_tense_catalog() -> None:
+    global TENSE_CATALOG
+    rows = await db.fetchall("""
+        SELECT time_name, translation_name, description, formula, example, translation_example,
+               negative_formula, example_negative, translation_example_negative,
+               interrogative_formula, example_interrogative, translation_example_interrogative
+        FROM times
+    """)
+    catalog = {tense_callback_data(row[0]): render_tense_card(row) for row in rows}
+    TENSE_CATALOG = MappingProxyType(catalog)
+    logging.info(f"Tense catalog loaded: {len(catalog)} tenses")
+
+
+@callback_handler(NS.TENSE)
+async def handle_active_tense(callback_query: types.CallbackQuery, state: FSMContext, callback_args: tuple):
+    logging.info(f"{callback_query.data} {callback_query.from_user.id}")
+    index, = callback_args
+    card = None
+    if isinstance(index, int) and 0 <= index < len(ACTIVE_TENSES):
+        card = TENSE_CATALOG.get(tense_callback_data(ACTIVE_TENSES[index]))
+    if card:
+        await callback_query.message.answer(card, parse_mode='HTML')
+    else:
+        await callback_query.message.answer("Данные не найдены.")
 
-@grammar_router.callback_query(F.data == "select_passive_voice")
+@callback_handler(NS.PASSIVE_VOICE)
 async def handle_passive_voice(callback_query: types.CallbackQuery, state: FSMContext):
     logging.info(f"handle_passive_voice {callback_query.from_user.id}")
 
@@ -0,0 +1,53 @@
+from typing import Awaitable, Callable, Hashable, Optional
+
+from aiogram.types import InlineQueryResultArticle
+
+from cache import LRUCache, on_topic_list_changed
+
+# Сколько готовых ответов на инлайн-запросы держать в памяти и сколько секунд
+INLINE_CACHE_SIZE = 10000
+INLINE_CACHE_TTL = 5 * 60
+# Сколько секунд Telegram может сам показывать прошлый ответ (cache_time в answerInlineQuery).
+# Темы меняются, поэтому их Telegram кэширует ненадолго; таблица глаголов не меняется никогда.
+TOPIC_RESULTS_CACHE_TIME = 10
+VERB_RESULTS_CACHE_TIME = 24 * 60 * 60
+
+# Области кэша: поиск тем для добавления слов, для повторения и поиск глаголов
+ADD_WORDS_TOPICS = "add_words_topics"
+REPEAT_TOPICS = "repeat_topics"
+IRREGULAR_VERBS = "irregular_verbs"
+TOPIC_SCOPES = (ADD_WORDS_TOPICS, REPEAT_TOPICS)
+
+_results = LRUCache(INLINE_CACHE_SIZE, ttl=INLINE_CACHE_TTL)
+# Поколение области входит в ключ: после сброса старые записи просто перестают находиться
+_generations: dict[str, int] = {}
+
+
+# Нормализация запроса для ключа кэша: "  past   simple " и "past simple" — один запрос
+def normalize_query(query: str) -> str:
+    return " ".join(query.split())
+
+
+# Функция для получения результатов инлайн-запроса из кэша или построения их через build(query).
+# owner — id пользователя, если результаты зависят от него, и None для общих результатов.
+async def cached_inline_results(scope: str, owner: Optional[int], query: str,
+                                build: Callable[[str], Awaitable[list[InlineQueryResultArticle]]]
+                                ) -> list[InlineQueryResultArticle]:
+    query = normalize_query(query)
+    key: Hashable = (scope, _generations.get(scope, 0), owner, query)
+    results = _results.get(key)
+    if results is None:
+        results = await build(query)
+        _results.set(key, results)
+    return results
+
+
+# Функция для сброса всех результатов области
+def invalidate_inline_results(scope: str) -> None:
+    _generations[scope] = _generations.get(scope, 0) + 1
+
+
+@on_topic_list_changed
+def _drop_topic_results() -> None:
+    for scope in TOPIC_SCOPES:
+        invalidate_inline_results(scope)
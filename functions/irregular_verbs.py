@@ -0,0 +1,350 @@
+import asyncio
+import logging
+import random
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Sequence
+
+from database import db
+
+# Максимальная длина n-граммы в индексе подстрок
+NGRAM_SIZE = 3
+
+# Доля вопросов "Продолжи ряд", которые берутся из глаголов с ошибками
+MISTAKE_REVIEW_SHARE = 0.3
+# Максимальный вес глагола, на котором пользователь ошибался
+MAX_MISTAKE_WEIGHT = 10
+# Сколько колод пользователей держать в памяти
+MAX_CACHED_DECKS = 10000
+# Как часто (в секундах) и при каком числе изменений записывать веса ошибок в базу
+MISTAKES_FLUSH_INTERVAL = 5
+MISTAKES_FLUSH_THRESHOLD = 200
+
+
+class Verb(NamedTuple):
+    v1: str
+    v1_second: Optional[str]
+    v2_first: str
+    v2_second: Optional[str]
+    v3_first: str
+    v3_second: Optional[str]
+    first_translation: str
+    second_translation: Optional[str]
+    third_translation: Optional[str]
+
+    @property
+    def infinitive(self) -> str:
+        return self.v1 or self.v1_second
+
+    @property
+    def translations(self) -> list[str]:
+        return [t for t in (self.first_translation, self.second_translation, self.third_translation) if t]
+
+    def forms(self) -> list[str]:
+        """Все формы глагола и переводы, по которым ведётся поиск."""
+        return [f for f in (self.v1, self.v1_second, self.v2_first, self.v2_second,
+                            self.v3_first, self.v3_second) if f] + self.translations
+
+
+VERB_FIELDS = ("v1, v1_second, v2_first, v2_second, v3_first, v3_second, "
+               "first_translation, second_translation, third_translation")
+
+
+def normalize(text: str) -> str:
+    return text.strip().lower().replace("ё", "е")
+
+
+def _ngrams(text: str) -> set[str]:
+    grams = set()
+    for size in range(1, NGRAM_SIZE + 1):
+        for i in range(len(text) - size + 1):
+            grams.add(text[i:i + size])
+    return grams
+
+
+def _join_forms(first: Optional[str], second: Optional[str]) -> str:
+    if first and second:
+        return f"{first} / {second}"
+    return first or "Неизвестно"
+
+
+# Функция для формирования карточки глагола в формате Markdown
+def render_verb_card(verb: Verb) -> str:
+    parts = [
+        f"*Infinitive:* {_join_forms(verb.v1, verb.v1_second)}",
+        f"*Past Simple:* {_join_forms(verb.v2_first, verb.v2_second)}",
+        f"*Past Participle:* {_join_forms(verb.v3_first, verb.v3_second)}",
+    ]
+    translations = verb.translations
+    if len(translations) > 1:
+        parts.append(f"*Translations:* {', '.join(translations)}")
+    if len(translations) == 1:
+        parts.append(f"*Translation:* {translations[0]}")
+    return "\n".join(parts)
+
+
+class VerbIndex:
+    """Индекс неправильных глаголов в памяти.
+
+    Префиксный поиск идёт по отсортированному массиву ключей (bisect),
+    поиск подстроки — по словарю n-грамм. Готовые карточки глаголов
+    хранятся рядом, чтобы не формировать их на каждый запрос.
+    """
+
+    def __init__(self, verbs: Sequence[Verb]) -> None:
+        self.verbs: tuple[Verb, ...] = tuple(verbs)
+        self.cards: tuple[str, ...] = tuple(render_verb_card(verb) for verb in self.verbs)
+
+        pairs = sorted({(normalize(form), i) for i, verb in enumerate(self.verbs) for form in verb.forms()})
+        self._keys: list[str] = [key for key, _ in pairs]
+        self._key_ids: list[int] = [i for _, i in pairs]
+
+        self._ngrams: dict[str, set[int]] = {}
+        for key, i in pairs:
+            for gram in _ngrams(key):
+                self._ngrams.setdefault(gram, set()).add(i)
+
+        self._by_infinitive: dict[str, int] = {}
+        for i, verb in enumerate(self.verbs):
+            for name in (verb.v1, verb.v1_second):
+                if name:
+                    self._by_infinitive.setdefault(name, i)
+                    self._by_infinitive.setdefault(normalize(name), i)
+
+    def __len__(self) -> int:
+        return len(self.verbs)
+
+    def _prefix_ids(self, query: str) -> list[int]:
+        ids = []
+        pos = bisect_left(self._keys, query)
+        while pos < len(self._keys) and self._keys[pos].startswith(query):
+            ids.append(self._key_ids[pos])
+            pos += 1
+        return ids
+
+    def _substring_ids(self, query: str) -> set[int]:
+        if len(query) <= NGRAM_SIZE:
+            return self._ngrams.get(query, set())
+        grams = [query[i:i + NGRAM_SIZE] for i in range(len(query) - NGRAM_SIZE + 1)]
+        candidates = set.intersection(*(self._ngrams.get(gram, set()) for gram in grams))
+        return {i for i in candidates if any(query in normalize(form) for form in self.verbs[i].forms())}
+
+    def search(self, query: str, limit: int = 50) -> list[Verb]:
+        """Ищет глаголы по любой форме или переводу: сначала совпадения по началу слова."""
+        query = normalize(query)
+        if not query:
+            return sorted(self.verbs, key=lambda verb: verb.v1)[:limit]
+
+        ordered: dict[int, None] = {}
+        for i in self._prefix_ids(query):
+            ordered.setdefault(i)
+            if len(ordered) >= limit:
+                return [self.verbs[i] for i in ordered]
+        for i in sorted(self._substring_ids(query) - ordered.keys(), key=lambda i: self.verbs[i].v1):
+            ordered.setdefault(i)
+            if len(ordered) >= limit:
+                break
+        return [self.verbs[i] for i in ordered]
+
+    def find(self, name: str) -> Optional[int]:
+        """Возвращает номер глагола по инфинитиву (v1 или v1_second)."""
+        index = self._by_infinitive.get(name)
+        if index is None:
+            index = self._by_infinitive.get(normalize(name))
+        return index
+
+    def card(self, name: str) -> Optional[str]:
+        index = self.find(name)
+        return self.cards[index] if index is not None else None
+
+
+VERB_INDEX = VerbIndex(())
+
+
+# Функция для загрузки таблицы неправильных глаголов в память
+async def load_verb_index() -> None:
+    global VERB_INDEX
+    rows = await db.fetchall(f"SELECT {VERB_FIELDS} FROM irregular_verbs")
+    VERB_INDEX = VerbIndex([Verb(*row) for row in rows])
+    logging.info(f"Irregular verb index loaded: {len(VERB_INDEX)} verbs")
+
+
+class AliasTable:
+    """Выборка элемента с заданными весами за O(1) (алиас-метод Уолкера)."""
+
+    def __init__(self, items: Sequence, weights: Sequence[float]) -> None:
+        count = len(items)
+        total = float(sum(weights))
+        self.items = tuple(items)
+        self._prob = [1.0] * count
+        self._alias = list(range(count))
+
+        scaled = [weight * count / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._prob[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    def sample(self):
+        i = random.randrange(len(self.items))
+        return self.items[i] if random.random() < self._prob[i] else self.items[self._alias[i]]
+
+
+class VerbDeck:
+    """Колода глаголов пользователя для серии "Продолжи ряд".
+
+    Основная часть вопросов берётся из перемешанного массива номеров
+    глаголов без повторов, пока колода не закончится. Часть вопросов
+    выбирается по весам из глаголов, в которых пользователь ошибался.
+    """
+
+    def __init__(self, index: VerbIndex, mistakes: dict[str, int]) -> None:
+        self.index = index
+        self.order = list(range(len(index)))
+        random.shuffle(self.order)
+        self.position = 0
+        self.mistakes = mistakes
+        self.last: Optional[int] = None
+        self._table: Optional[AliasTable] = None
+
+    def set_weight(self, verb: str, weight: int) -> None:
+        if weight > 0:
+            self.mistakes[verb] = weight
+        else:
+            self.mistakes.pop(verb, None)
+        self._table = None
+
+    def _draw_mistake(self) -> Optional[int]:
+        if self._table is None:
+            self._table = AliasTable(list(self.mistakes), list(self.mistakes.values()))
+        return self.index.find(self._table.sample())
+
+    def draw(self) -> Optional[Verb]:
+        if not self.order:
+            return None
+        choice = None
+        if self.mistakes and random.random() < MISTAKE_REVIEW_SHARE:
+            choice = self._draw_mistake()
+        if choice is None or choice == self.last:
+            if self.position >= len(self.order):
+                random.shuffle(self.order)
+                self.position = 0
+            choice = self.order[self.position]
+            self.position += 1
+        self.last = choice
+        return self.index.verbs[choice]
+
+
+_decks: OrderedDict[int, VerbDeck] = OrderedDict()
+# Изменённые веса ошибок, ещё не записанные в базу: user_id -> {v1: вес}
+_pending_mistakes: dict[int, dict[str, int]] = {}
+_pending_count = 0
+_flush_task: Optional[asyncio.Task] = None
+_flush_lock = asyncio.Lock()
+# Будит фоновую запись раньше интервала, когда изменений накопилось много
+_flush_now = asyncio.Event()
+
+
+async def _get_deck(user_id: int) -> VerbDeck:
+    deck = _decks.get(user_id)
+    if deck is not None and deck.index is VERB_INDEX:
+        _decks.move_to_end(user_id)
+        return deck
+
+    rows = await db.fetchall("SELECT verb, weight FROM verb_mistakes WHERE user_id = ?", (user_id,))
+    mistakes = {verb: weight for verb, weight in rows}
+    # Изменения, которые ещё не успели попасть в базу
+    mistakes.update(_pending_mistakes.get(user_id, {}))
+    deck = VerbDeck(VERB_INDEX, {verb: weight for verb, weight in mistakes.items() if weight > 0})
+
+    _decks[user_id] = deck
+    if len(_decks) > MAX_CACHED_DECKS:
+        _decks.popitem(last=False)
+    return deck
+
+
+# Функция для выбора следующего глагола для пользователя
+async def draw_verb(user_id: int) -> Optional[Verb]:
+    deck = await _get_deck(user_id)
+    return deck.draw()
+
+
+# Функция для учёта ответа: ошибка увеличивает вес глагола, верный ответ уменьшает
+def record_verb_answer(user_id: int, verb: str, correct: bool) -> None:
+    global _pending_count
+    deck = _decks.get(user_id)
+    weight = deck.mistakes.get(verb, 0) if deck else _pending_mistakes.get(user_id, {}).get(verb, 0)
+    if correct and weight == 0:
+        return
+    weight = max(0, weight - 1) if correct else min(MAX_MISTAKE_WEIGHT, weight + 1)
+    if deck:
+        deck.set_weight(verb, weight)
+    pending = _pending_mistakes.setdefault(user_id, {})
+    if verb not in pending:
+        _pending_count += 1
+    pending[verb] = weight
+
+    if _pending_count >= MISTAKES_FLUSH_THRESHOLD:
+        _flush_now.set()
+
+
+# Функция для пакетной записи накопленных весов ошибок
+async def flush_verb_mistakes() -> None:
+    global _pending_count
+    async with _flush_lock:
+        if not _pending_mistakes:
+            return
+        # Веса остаются в _pending_mistakes до коммита, чтобы _get_deck не собрал колоду из старых весов
+        batch = [(user_id, verb, weight) for user_id, verbs in _pending_mistakes.items()
+                 for verb, weight in verbs.items()]
+        try:
+            await db.write_all([
+                ("""INSERT INTO verb_mistakes (user_id, verb, weight) VALUES (?, ?, ?)
+                    ON CONFLICT(user_id, verb) DO UPDATE SET weight = excluded.weight""", (user_id, verb, weight))
+                if weight > 0 else
+                ("DELETE FROM verb_mistakes WHERE user_id = ? AND verb = ?", (user_id, verb))
+                for user_id, verb, weight in batch
+            ])
+        except Exception as e:
+            # Веса остались в _pending_mistakes и попадут в следующую пачку
+            logging.error(f"Database error while saving verb mistakes: {e!r}")
+            return
+        # Убираем записанное, если вес не успел измениться ещё раз
+        for user_id, verb, weight in batch:
+            verbs = _pending_mistakes.get(user_id)
+            if verbs is not None and verbs.get(verb) == weight:
+                del verbs[verb]
+                if not verbs:
+                    del _pending_mistakes[user_id]
+        _pending_count = sum(map(len, _pending_mistakes.values()))
+
+
+async def _flush_periodically() -> None:
+    while True:
+        try:
+            await asyncio.wait_for(_flush_now.wait(), MISTAKES_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _flush_now.clear()
+        try:
+            await flush_verb_mistakes()
+        except Exception as e:
+            logging.error(f"Verb mistakes flush failed: {e!r}")
+
+
+async def start_mistakes_flusher() -> None:
+    global _flush_task
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_periodically())
+
+
+async def stop_mistakes_flusher() -> None:
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+    await flush_verb_mistakes()
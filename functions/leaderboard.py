@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import sqlite3
+from typing import NamedTuple, Optional
+
+from database import db
+from functions.user_profiles import UserProfile
+
+# Сколько пользователей показывать в таблице лидеров
+TOP_SIZE = 15
+# Сколько пользователей держать в памяти: запас нужен, чтобы при уменьшении
+# счётчика у кого-то из топа не приходилось сразу перечитывать таблицу
+TOP_RESERVE = TOP_SIZE * 2
+
+LEADERBOARD_TITLE = "<b>🔝Top-15 пользователей по изученным словам:</b>\n\n"
+
+
+class Leader(NamedTuple):
+    user_id: int
+    full_name: str
+    learned_words_count: int
+
+
+# Функция для выбора правильного окончания слова "слово"
+def word_form(count: int) -> str:
+    if count == 1:
+        return "слово"
+    if 2 <= count <= 4:
+        return "слова"
+    return "слов"
+
+
+# Функция для формирования сообщения с таблицей лидеров
+def render_leaderboard(leaders: tuple[Leader, ...]) -> Optional[str]:
+    lines = []
+    for idx, (user_id, full_name, learned_words_count) in enumerate(leaders, start=1):
+        if learned_words_count == 0:
+            continue  # Пропускаем пользователей с 0 словами
+        user_link = f"<a href='tg://user?id={user_id}'>{full_name}</a>"
+        lines.append(f"{idx}. {user_link} - {learned_words_count} {word_form(learned_words_count)}\n")
+    return LEADERBOARD_TITLE + "".join(lines) if lines else None
+
+
+class Leaderboard:
+    """Таблица лидеров в памяти.
+
+    Хранит лучших пользователей с запасом и обновляется точечно, когда
+    меняется счётчик слов или имя пользователя. Готовое сообщение
+    пересобирается только если изменился сам топ-15.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[int, Leader] = {}
+        self._loaded = False
+        self._top: tuple[Leader, ...] = ()
+        self._message: Optional[str] = None
+        self._lock = asyncio.Lock()
+
+    def _rebuild(self) -> None:
+        ranked = sorted(self._entries.values(), key=lambda leader: -leader.learned_words_count)
+        self._entries = {leader.user_id: leader for leader in ranked[:TOP_RESERVE]}
+        top = tuple(ranked[:TOP_SIZE])
+        if top != self._top:
+            self._top = top
+            self._message = render_leaderboard(top)
+
+    async def _load(self) -> None:
+        rows = await db.fetchall(
+            "SELECT user_id, full_name, learned_words_count FROM users ORDER BY learned_words_count DESC LIMIT ?",
+            (TOP_RESERVE,))
+        self._entries = {row[0]: Leader(row[0], row[1], row[2] or 0) for row in rows}
+        self._loaded = True
+        self._rebuild()
+
+    async def message(self) -> Optional[str]:
+        async with self._lock:
+            if not self._loaded:
+                await self._load()
+            return self._message
+
+    def reset(self) -> None:
+        """Сбрасывает таблицу: она перечитается из базы при следующем показе."""
+        self._loaded = False
+
+    def _cutoff(self) -> int:
+        return min((entry.learned_words_count for entry in self._entries.values()), default=0)
+
+    async def refresh_user(self, user_id: int, leader: Optional[Leader]) -> None:
+        """Учитывает новое значение счётчика или имени пользователя; leader=None — пользователя нет."""
+        if not self._loaded:
+            return
+        # Пользователя нет в запасе и с таким счётчиком он туда не попадёт: блокировка не нужна
+        if (user_id not in self._entries and len(self._entries) >= TOP_RESERVE
+                and (leader is None or leader.learned_words_count <= self._cutoff())):
+            return
+
+        async with self._lock:
+            if not self._loaded:
+                return
+            was_listed = user_id in self._entries
+            cutoff = self._cutoff()
+            full = len(self._entries) >= TOP_RESERVE
+
+            if leader is not None and (not full or leader.learned_words_count > cutoff or was_listed):
+                self._entries[user_id] = leader
+            else:
+                self._entries.pop(user_id, None)
+
+            # Пользователь из запаса опустился ниже остальных: его место мог занять
+            # кто-то, кого нет в памяти, поэтому перечитываем топ по индексу
+            if was_listed and full and (leader is None or leader.learned_words_count < cutoff):
+                await self._load()
+            else:
+                self._rebuild()
+
+
+LEADERBOARD = Leaderboard()
+
+
+# Функция для обновления таблицы лидеров после изменения данных пользователя.
+# Новые значения передаёт вызывающий код (профиль из кэша), база перечитывается,
+# только если кто-то выбыл из запаса.
+async def refresh_leaderboard(user_id: int, profile: Optional[UserProfile]) -> None:
+    leader = Leader(user_id, profile.full_name, profile.learned_words_count) if profile else None
+    try:
+        await LEADERBOARD.refresh_user(user_id, leader)
+    except sqlite3.Error as e:
+        logging.error(f"Database error while refreshing leaderboard: {e}")
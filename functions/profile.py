@@ -1,30 +1,33 @@
+import asyncio
 import logging
 import sqlite3
+from typing import Optional
 
-import aiosqlite
-from aiogram import types, F, Router
+from aiogram import Bot, types, F, Router
 from aiogram.filters import StateFilter
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, InlineQuery, InlineQueryResultArticle, \
     InputTextMessageContent
 from aiogram.fsm.context import FSMContext
-from pyexpat.errors import messages
 
+from callbacks import NS, callback_handler, pack
+from functions.leaderboard import LEADERBOARD
 from functions.start_command import check_elite_status
-from shared import dp, DB_FILE, create_connection
+from functions.user_profiles import forget_profiles, get_profile
+from database import db
+from migrations import RECONCILE_COUNTERS_SQL
+from shared import dp
 
 profile_router = Router()
 
-# Функция для получения данных пользователя
-async def get_user_data(user_id: int):
-    async with aiosqlite.connect("database.db") as db:
-        async with db.execute(
-            "SELECT full_name, elite_status, learned_words_count, topics_count FROM users WHERE user_id = ?",
-            (user_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return row[0], row[1], row[2], row[3]
-            else:
-                return None, None, 0, 0 # Вернём 0 для изученных слов, если пользователь не найден
+# Как часто (в секундах) сверять счётчики слов и тем с данными
+COUNTERS_RECONCILE_INTERVAL = 60 * 60
+# Сколько секунд Telegram может показывать ответ на "Поделиться". Его кэш нельзя сбросить,
+# поэтому срок короткий: иначе новое имя бота или текст ссылки появились бы только через сутки
+REF_INLINE_CACHE_TIME = 5 * 60
+
+# Имя бота для реферальных ссылок, запрашивается у Telegram один раз при старте
+bot_username = "language_nova_bot"
+
 
 @profile_router.message(F.text == "Профиль", StateFilter(None))
 async def check_profile(message: types.Message, state: FSMContext) -> None:
@@ -33,16 +36,16 @@ async def check_profile(message: types.Message, state: FSMContext) -> None:
     user_id = message.from_user.id
     first_name = message.from_user.first_name
     last_name = message.from_user.last_name
-    full_name, elite_status, learned_words_count, topics_count = await get_user_data(user_id)
-    await update_learned_words_count(user_id)
-    await update_learned_topics_count(user_id)
+    # Счётчики берутся из кэша профилей, его обновляют обработчики, которые меняют слова и темы
+    profile = await get_profile(user_id)
+    learned_words_count, topics_count = (profile.learned_words_count, profile.topics_count) if profile else (0, 0)
     full_name = f"{first_name} {last_name}" if first_name and last_name else first_name or last_name or "Пользователь"
     # elite_status_text = "Элитный" if elite_status == "Yes" else "Free"
     # elite_or_free_emoji = "💎" if elite_status_text == "Элитный" else "🆓"
     #
     # elite_status = await check_elite_status(message.from_user.id)
-    button = InlineKeyboardButton(text="🏆Leaders Page", callback_data="top_leaders")
-    button_2 = InlineKeyboardButton(text="Реферальная программа", callback_data="my_refs")
+    button = InlineKeyboardButton(text="🏆Leaders Page", callback_data=pack(NS.TOP_LEADERS))
+    button_2 = InlineKeyboardButton(text="Реферальная программа", callback_data=pack(NS.MY_REFS))
     keyboard = InlineKeyboardMarkup(inline_keyboard=[[button], [button_2]])
 
     await message.answer(
@@ -53,85 +56,77 @@ async def check_profile(message: types.Message, state: FSMContext) -> None:
         parse_mode='HTML', reply_markup=keyboard
     )
 
-async def get_top_users() -> list:
-    async with aiosqlite.connect("database.db") as db:
-        async with db.execute(
-                "SELECT user_id, full_name, learned_words_count FROM users ORDER BY learned_words_count DESC LIMIT 15"
-        ) as cursor:
-            rows = await cursor.fetchall()
-            return rows
-
-
-@profile_router.callback_query(F.data == "top_leaders")
+@callback_handler(NS.TOP_LEADERS)
 async def top_users(callback_query: types.CallbackQuery, state: FSMContext) -> None:
     logging.info(f"top_users {callback_query.from_user.id}")
-    rows = await get_top_users()
-
-    if not rows:
-        await callback_query.answer("Топ-15 пользователей отсутствует.")
-        return
-
-    response = "<b>🔝Top-15 пользователей по изученным словам:</b>\n\n"
-    for idx, (user_id, full_name, learned_words_count) in enumerate(rows, start=1):
-        if learned_words_count == 0:
-            continue  # Пропускаем пользователей с 0 словами
-
-        user_link = f"<a href='tg://user?id={user_id}'>{full_name}</a>"  # Форматируем ссылку
-
-        # Определяем правильное окончание для слова "слово"
-        if learned_words_count == 1:
-            word_form = "слово"
-        elif 2 <= learned_words_count <= 4:
-            word_form = "слова"
-        else:
-            word_form = "слов"
-
-        response += f"{idx}. {user_link} - {learned_words_count} {word_form}\n"
+    try:
+        # Сообщение собирается заново только когда меняется топ-15
+        response = await LEADERBOARD.message()
+    except sqlite3.Error as e:
+        logging.error(f"Database error: {e}")
+        response = None
 
-    if response == "<b>🔝Top-15 пользователей по изученным словам:</b>\n\n":
+    if response is None:
         await callback_query.answer("Топ-15 пользователей отсутствует.")
     else:
         await callback_query.message.answer(response, parse_mode='HTML')
 
 
-# Функция для обновления количества изученных слов
-async def update_learned_words_count(user_id: int) -> int:
-    conn = create_connection(DB_FILE)
+# Счётчики learned_words_count и topics_count меняются триггерами в той же
+# транзакции, что и слова и темы (см. migrations.upgrade_to_v4).
+# Функция для исправления счётчиков, если они всё же разошлись с данными
+async def reconcile_counters() -> int:
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM user_dictionary WHERE user_id = ?", (user_id,))
-        learned_words_count = cursor.fetchone()[0]
-        cursor.execute("UPDATE users SET learned_words_count = ? WHERE user_id = ?", (learned_words_count, user_id))
-        conn.commit()
-        logging.info(f"Updated learned_words_count for user {user_id}: {learned_words_count}")
-        return learned_words_count
+        fixed = await db.execute(RECONCILE_COUNTERS_SQL)
+        if fixed:
+            logging.warning(f"Reconciled counters for {fixed} users")
+            LEADERBOARD.reset()
+            forget_profiles()
+        return fixed
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
         return 0
-    finally:
-        conn.close()
 
-# Функция для обновления количества тем
-async def update_learned_topics_count(user_id: int) -> None:
-    logging.info(f"id {user_id}")
-    conn = create_connection(DB_FILE)
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""SELECT COUNT(*) FROM topics WHERE author_id = ?""", (user_id,))
-        topics_count = cursor.fetchone()[0]
-        cursor.execute("""UPDATE users SET topics_count = ? WHERE user_id = ?""", (topics_count, user_id))
-        conn.commit()
-        return topics_count
-    except sqlite3.Error as e:
-        logging.error(f"Database error: {e}")
-        return 0
-    finally:
-        conn.close()
+
+_reconcile_task: Optional[asyncio.Task] = None
+
+
+async def _reconcile_periodically() -> None:
+    while True:
+        await asyncio.sleep(COUNTERS_RECONCILE_INTERVAL)
+        await reconcile_counters()
+
+
+@profile_router.startup()
+async def start_counters_reconciler() -> None:
+    global _reconcile_task
+    if _reconcile_task is None:
+        _reconcile_task = asyncio.create_task(_reconcile_periodically())
+
+
+@profile_router.shutdown()
+async def stop_counters_reconciler() -> None:
+    global _reconcile_task
+    if _reconcile_task is not None:
+        _reconcile_task.cancel()
+        _reconcile_task = None
+
+@profile_router.startup()
+async def cache_bot_identity(bot: Bot) -> None:
+    global bot_username
+    # bot.me() запоминает ответ getMe, дальше он не запрашивается
+    bot_username = (await bot.me()).username
+
+
+# Функция для формирования реферальной ссылки пользователя
+def referral_link(user_id: int) -> str:
+    return f"http://t.me/{bot_username}?start={user_id}"
+
 
 @profile_router.inline_query(F.query == "Поделиться")
 async def ref_inline(inline_query: InlineQuery):
+    logging.info(f"ref_inline {inline_query.from_user.id}")
     user_id = inline_query.from_user.id
-    bot_name = (await inline_query.bot.me()).username
     results: list[InlineQueryResultArticle] = []
 
     results.append(InlineQueryResultArticle(
@@ -139,19 +134,18 @@ async def ref_inline(inline_query: InlineQuery):
         title="Нажмите, чтобы отправить реферальную ссылку",
         description="",
         input_message_content=InputTextMessageContent(
-            message_text=f"http://t.me/language_nova_bot?start={user_id}"
+            message_text=referral_link(user_id)
         )
     ))
-    await inline_query.answer(results, is_personal=True)
+    await inline_query.answer(results, cache_time=REF_INLINE_CACHE_TIME, is_personal=True)
 
-@profile_router.callback_query(F.data == "my_refs")
+@callback_handler(NS.MY_REFS)
 async def send_referral_link(callback_query: types.CallbackQuery) -> None:
     user_id = callback_query.from_user.id
-    referral_link = f"http://t.me/language_nova_bot?start={user_id}"
 
     # Отправляем сообщение с инлайн кнопкой для выбора чата
     await callback_query.message.answer(
-        f"Ваша реферальная ссылка:\n{referral_link}",
+        f"Ваша реферальная ссылка:\n{referral_link(user_id)}",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
             [
                 InlineKeyboardButton(text="Пригласить друга", switch_inline_query=f"Поделиться")
@@ -0,0 +1,191 @@
+import asyncio
+import datetime
+import logging
+import sqlite3
+import time
+from typing import Optional
+
+from aiogram import Bot, F, Router, types
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from callbacks import NS, callback_handler, pack
+from database import db
+from outbound import BULK, send_priority
+
+reminders_router = Router()
+
+# Как часто (в секундах) начинать новый проход по пользователям
+REMINDER_INTERVAL = 60 * 60
+# Не чаще одного напоминания за это время
+REMINDER_MIN_GAP = 20 * 60 * 60
+# Через сколько секунд продолжить проход, который прервался ошибкой
+REMINDER_RETRY_DELAY = 60
+# Сколько пользователей читать за один запрос к базе и после скольких сохранять прогресс
+REMINDER_BATCH_SIZE = 500
+REMINDER_CHUNK_SIZE = 50
+# Тихие часы считаются по московскому времени
+REMINDER_TIMEZONE = datetime.timezone(datetime.timedelta(hours=3))
+
+# Пользователи со словами к повторению, по возрастанию user_id начиная с курсора.
+# Запрос читает только покрывающие индексы: idx_word_reviews_due и idx_user_dictionary_topic_user.
+DUE_USERS_SQL = """
+    SELECT r.user_id, COUNT(*), COALESCE(s.quiet_start, 22), COALESCE(s.quiet_end, 9)
+    FROM word_reviews r
+    JOIN user_dictionary d ON d.user_id = r.user_id AND d.topic_id = r.topic_id AND d.word = r.word
+    LEFT JOIN reminder_settings s ON s.user_id = r.user_id
+    WHERE r.user_id > ? AND r.due_at <= ?
+      AND COALESCE(s.enabled, 1) = 1 AND COALESCE(s.last_sent_at, 0) <= ?
+    GROUP BY r.user_id
+    ORDER BY r.user_id
+    LIMIT ?
+"""
+
+
+def in_quiet_hours(now: float, quiet_start: int, quiet_end: int) -> bool:
+    hour = datetime.datetime.fromtimestamp(now, REMINDER_TIMEZONE).hour
+    if quiet_start <= quiet_end:
+        return quiet_start <= hour < quiet_end
+    return hour >= quiet_start or hour < quiet_end  # Тихие часы через полночь
+
+
+# Функция для отправки одного напоминания; возвращает True, если оно доставлено
+async def send_reminder(bot: Bot, user_id: int, due_count: int) -> bool:
+    try:
+        await bot.send_message(user_id, f"Пора повторить слова! Слов к повторению: {due_count}.\n"
+                                        f"Нажмите «Повторение слов», чтобы начать.",
+                               reply_markup=reminders_keyboard(True))
+        return True
+    except TelegramForbiddenError:
+        # Пользователь заблокировал бота: больше не пишем ему
+        await set_reminders_enabled(user_id, False)
+    except TelegramAPIError as e:
+        logging.error(f"Failed to send reminder to {user_id}: {e}")
+    except Exception as e:
+        # Ошибка одного получателя не должна прерывать рассылку остальным
+        logging.error(f"Unexpected error while sending reminder to {user_id}: {e!r}")
+    return False
+
+
+async def _save_progress(run_started_at: float, last_user_id: Optional[int], sent: list[int], sent_at: float) -> None:
+    await db.write_all([
+        *(("""INSERT INTO reminder_settings (user_id, last_sent_at) VALUES (?, ?)
+              ON CONFLICT(user_id) DO UPDATE SET last_sent_at = excluded.last_sent_at""", (user_id, sent_at))
+          for user_id in sent),
+        ("""INSERT INTO reminder_runs (id, started_at, last_user_id) VALUES (1, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET started_at = excluded.started_at,
+                                          last_user_id = excluded.last_user_id""",
+         (run_started_at, last_user_id)),
+    ])
+
+
+# Функция для одного прохода рассылки начиная с пользователя после cursor.
+# Прогресс сохраняется после каждой пачки, поэтому после перезапуска проход продолжается с того же места.
+async def broadcast_reminders(bot: Bot, run_started_at: float, cursor: int) -> int:
+    # Напоминания уступают ответам пользователям в очереди отправки
+    send_priority.set(BULK)
+    total = 0
+    while True:
+        now = time.time()
+        rows = await db.fetchall(DUE_USERS_SQL, (cursor, run_started_at, now - REMINDER_MIN_GAP,
+                                                 REMINDER_BATCH_SIZE))
+        if not rows:
+            await _save_progress(run_started_at, None, [], now)
+            return total
+
+        for start in range(0, len(rows), REMINDER_CHUNK_SIZE):
+            chunk = rows[start:start + REMINDER_CHUNK_SIZE]
+            # Пользователи в тихих часах получат напоминание в одном из следующих проходов
+            recipients = [(user_id, due) for user_id, due, quiet_start, quiet_end in chunk
+                          if not in_quiet_hours(now, quiet_start, quiet_end)]
+            delivered = await asyncio.gather(*(send_reminder(bot, user_id, due) for user_id, due in recipients))
+            sent = [user_id for (user_id, _), ok in zip(recipients, delivered) if ok]
+            total += len(sent)
+
+            cursor = chunk[-1][0]
+            await _save_progress(run_started_at, cursor, sent, time.time())
+
+
+# Фоновая задача рассылки напоминаний, запускается из main().
+# Время следующего прохода считается от начала прошлого (reminder_runs), в том числе
+# сразу после старта: перезапуск бота не вызывает внеочередную рассылку.
+async def run_reminders(bot: Bot) -> None:
+    while True:
+        try:
+            run = await db.fetchone("SELECT started_at, last_user_id FROM reminder_runs WHERE id = 1")
+            if run is None:
+                # Первый запуск: отсчитываем интервал от текущего момента
+                await _save_progress(time.time(), None, [], time.time())
+                continue
+            if run[1] is not None:
+                # Прошлый проход прервался: продолжаем его
+                run_started_at, cursor = run
+            else:
+                wait = run[0] + REMINDER_INTERVAL - time.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                run_started_at, cursor = time.time(), 0
+            started = time.perf_counter()
+            sent = await broadcast_reminders(bot, run_started_at, cursor)
+            logging.info(f"Reminders sent: {sent} in {time.perf_counter() - started:.1f} s")
+        except Exception as e:
+            # Задача должна пережить любую ошибку; прогресс сохранён, проход продолжится с того же места
+            logging.error(f"Reminders pass failed: {e!r}")
+            await asyncio.sleep(REMINDER_RETRY_DELAY)
+
+
+# Функция для включения или отключения напоминаний пользователя
+async def set_reminders_enabled(user_id: int, enabled: bool) -> None:
+    try:
+        await db.write("""INSERT INTO reminder_settings (user_id, enabled) VALUES (?, ?)
+                          ON CONFLICT(user_id) DO UPDATE SET enabled = excluded.enabled""", (user_id, int(enabled)))
+    except sqlite3.Error as e:
+        logging.error(f"Database error: {e}")
+
+
+def reminders_keyboard(enabled: bool) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="Отключить напоминания" if enabled else "Включить напоминания",
+                             callback_data=pack(NS.REMINDERS, 0 if enabled else 1))
+    ]])
+
+
+@reminders_router.message(F.text.startswith("/reminders"))
+async def reminders_command(message: types.Message) -> None:
+    logging.info(f"reminders_command {message.from_user.id}")
+    row = await db.fetchone("SELECT enabled, quiet_start, quiet_end FROM reminder_settings WHERE user_id = ?",
+                            (message.from_user.id,))
+    enabled, quiet_start, quiet_end = row or (1, 22, 9)
+    await message.answer(f"Напоминания о повторении: {'включены' if enabled else 'отключены'}.\n"
+                         f"Тихие часы (МСК): с {quiet_start}:00 до {quiet_end}:00. "
+                         f"Изменить: /quiet 23 8",
+                         reply_markup=reminders_keyboard(bool(enabled)))
+
+
+@reminders_router.message(F.text.startswith("/quiet"))
+async def quiet_hours_command(message: types.Message) -> None:
+    logging.info(f"quiet_hours_command {message.from_user.id}")
+    args = message.text.split()[1:]
+    if len(args) != 2 or not all(arg.isdigit() and int(arg) < 24 for arg in args):
+        await message.answer("Укажите начало и конец тихих часов по Москве, например: /quiet 23 8")
+        return
+    quiet_start, quiet_end = map(int, args)
+    try:
+        await db.write("""INSERT INTO reminder_settings (user_id, quiet_start, quiet_end) VALUES (?, ?, ?)
+                          ON CONFLICT(user_id) DO UPDATE SET quiet_start = excluded.quiet_start,
+                                                             quiet_end = excluded.quiet_end""",
+                       (message.from_user.id, quiet_start, quiet_end))
+        await message.answer(f"Напоминания не будут приходить с {quiet_start}:00 до {quiet_end}:00 по Москве.")
+    except sqlite3.Error as e:
+        logging.error(f"Database error: {e}")
+        await message.answer("Произошла ошибка при сохранении настроек.")
+
+
+@callback_handler(NS.REMINDERS)
+async def toggle_reminders(callback_query: types.CallbackQuery, callback_args: tuple) -> None:
+    logging.info(f"toggle_reminders {callback_query.from_user.id}")
+    enabled, = callback_args
+    await set_reminders_enabled(callback_query.from_user.id, bool(enabled))
+    await callback_query.answer("Напоминания включены." if enabled else "Напоминания отключены.")
+    await callback_query.message.edit_reply_markup(reply_markup=reminders_keyboard(bool(enabled)))
@@ -6,14 +6,20 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import KeyboardButton, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton, \
     InlineQueryResultArticle, InputTextMessageContent
-import random
 
-from functions.profile import update_learned_words_count
-from shared import TOKEN, DB_FILE, TranslationStates, DeleteStates
-from aiogram.client.session.aiohttp import AiohttpSession
+from callbacks import NS, callback_handler
+from cache import topic_changed
+from functions.leaderboard import refresh_leaderboard
+from functions.inline_results import REPEAT_TOPICS, TOPIC_RESULTS_CACHE_TIME, cached_inline_results
+from functions.review_queue import advance, current_card, reset_session
+from functions.spaced_repetition import record_review
+from functions.topic_search import search_topics
+from functions.topic_cards import get_topic_card
+from functions.user_profiles import count_changed
+from functions.word_pages import get_topic_pages
+from database import db
+from shared import TranslationStates, DeleteStates
 
-session = AiohttpSession(proxy="http://proxy.server:3128")
-bot = Bot(token=TOKEN, session=session)
 repeat_words_router = Router()
 global current_topic_id
 
@@ -30,20 +36,14 @@ async def repeat_words(message: types.Message, state: FSMContext) -> None:
 
 
 @repeat_words_router.inline_query(F.query.startswith("поиск тем для повторения: "))
-async def inline_query_handler_repeat(inline_query: types.InlineQuery) -> None:
+async def inline_query_handler_repeat(inline_query: types.InlineQuery, bot: Bot) -> None:
     logging.info(f"inline_query_handler_repeat {inline_query.from_user.id}")
-    query = inline_query.query[len("поиск тем для повторения: "):].strip()  # Убираем команду
+    query = inline_query.query[len("поиск тем для повторения: "):]  # Убираем команду
     user_id = inline_query.from_user.id
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
 
-    try:
-        # Поиск тем по запросу
-        cursor.execute("""SELECT id, content
-                          FROM topics
-                          WHERE (author_id = ? OR visible = 1) AND content LIKE ?""",
-                       (user_id, f'%{query}%'))
-        results = cursor.fetchall()
+    async def build(query: str) -> list:
+        # Поиск тем по запросу: свои темы первыми, не больше 50 результатов
+        results = await search_topics(user_id, query)
 
         items = [
             InlineQueryResultArticle(
@@ -64,15 +64,19 @@ async def inline_query_handler_repeat(inline_query: types.InlineQuery) -> None:
                     input_message_content=InputTextMessageContent(message_text="Не найдено тем по вашему запросу.")
                 )
             ]
+        return items
+
+    try:
+        # Готовые результаты живут в памяти до создания или удаления темы
+        items = await cached_inline_results(REPEAT_TOPICS, user_id, query, build)
 
-        # Отправка результатов
-        await bot.answer_inline_query(inline_query.id, results=items)
+        # Отправка результатов: у каждого пользователя свои темы, Telegram кэширует их ненадолго
+        await bot.answer_inline_query(inline_query.id, results=items, cache_time=TOPIC_RESULTS_CACHE_TIME,
+                                      is_personal=True)
 
     except sqlite3.OperationalError as e:
         logging.error(f"Database error: {e}")
         await bot.answer_inline_query(inline_query.id, results=[])
-    finally:
-        conn.close()
 
 
 
@@ -82,48 +86,19 @@ async def process_topic_selection_repeat(message: types.Message, state: FSMConte
     logging.info(f"process_topic_selection_repeat {message.from_user.id}")
     topic_name = message.text.split(": ", 1)[-1]
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
     try:
-        cursor.execute("SELECT id, visible, author_id FROM topics WHERE content = ?", (topic_name,))
-        topic = cursor.fetchone()
-
-        if topic:
-            current_topic_id, is_visible, author_id = topic  # Устанавливаем глобальную переменную, статус видимости и автора
-
-            cursor.execute("SELECT COUNT(*) FROM user_dictionary WHERE topic_id = ?", (current_topic_id,))
-            word_count = cursor.fetchone()[0]
-
-            # Получаем информацию об авторе
-            cursor.execute("SELECT full_name FROM users WHERE user_id = ?", (author_id,))
-            author = cursor.fetchone()
-            author_username = author[0] if author else "Неизвестный автор"
-
-            # Создаем ссылку на профиль автора
-            author_link = f"[{author_username}](tg://user?id={author_id})"
-
-            message_text = (f"Название темы: *{topic_name}*\n"
-                            f"Количество слов: {word_count}\n"
-                            # f"Статус: {'Публичная' if is_visible else 'Приватная'}\n"
-                            f"Автор: {author_link}")
-
-            kb = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="RU-ENG", callback_data=f"ru_eng:{current_topic_id}"),
-                 InlineKeyboardButton(text="ENG-RU", callback_data=f"eng_ru:{current_topic_id}")],
-                [InlineKeyboardButton(text="Слова в теме", callback_data=f"show_words:{current_topic_id}")],
-                # [InlineKeyboardButton(text="Сделать приватной" if is_visible else "Сделать публичной",
-                #                      callback_data=f"toggle_visibility:{current_topic_id}")]
-            ])
-            await message.answer(message_text, parse_mode='Markdown', reply_markup=kb)
+        # Карточка темы (тема, автор и число слов) из кэша или одним запросом
+        card = await get_topic_card(topic_name)
+
+        if card:
+            current_topic_id = card.topic_id  # Устанавливаем глобальную переменную
+            await message.answer(card.text, parse_mode='Markdown', reply_markup=card.review_markup)
             await state.clear()
         else:
             await message.answer("Тема не найдена.")
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
         await message.answer("Произошла ошибка при получении данных.")
-    finally:
-        conn.close()
 
 
 # @repeat_words_router.callback_query(F.data.startswith("toggle_visibility:"))
@@ -205,40 +180,56 @@ async def stop_translation(message: types.Message, state: FSMContext):
     await message.answer("Повторение прекращено.", reply_markup=keyboard)
 
 
+# Функция для учёта ответа в расписании повторений.
+# Оценивается только первая попытка: после ошибки пользователь отвечает ещё раз,
+# но слово уже отмечено как забытое.
+async def grade_answer(message: types.Message, state: FSMContext, data: dict, correct: bool) -> None:
+    if data.get('current_failed') or not data.get('current_word'):
+        return
+    try:
+        await record_review(message.from_user.id, data.get('topic_id'), data.get('current_word'), correct)
+    except sqlite3.Error as e:
+        logging.error(f"Database error while saving review: {e}")
+    if not correct:
+        await state.update_data(current_failed=True)
+
+
+# Функция для перехода к следующему слову очереди после верного ответа.
+# Слово, на котором была ошибка, вернётся через несколько вопросов.
+def next_question(message: types.Message, data: dict) -> None:
+    advance(message.from_user.id, data.get('topic_id'), data.get('current_word'), relearn=bool(data.get('current_failed')))
+
+
 # Состояние для хранения текущего слова
-@repeat_words_router.callback_query(lambda c: c.data.startswith("eng_ru:"))
-async def start_eng_ru_translation(callback_query: types.CallbackQuery, state: FSMContext):
+@callback_handler(NS.ENG_RU)
+async def start_eng_ru_translation(callback_query: types.CallbackQuery, state: FSMContext, callback_args: tuple):
     logging.info(f"start_eng_ru_translation {callback_query.from_user.id}")
-    topic_id = callback_query.data.split(":")[1]
+    topic_id, = callback_args
     user_id = callback_query.from_user.id
 
     await state.update_data(topic_id=topic_id)
     await state.set_state(TranslationStates.ENG_RU)
+    reset_session(user_id, topic_id)
     await ask_for_ru_translation(callback_query.message, user_id, topic_id, state)
 
 @repeat_words_router.message(F.text=='ask_for_ru_translation')
 async def ask_for_ru_translation(message: types.Message, user_id: int, topic_id: int, state: FSMContext):
     logging.info(f"ask_for_ru_translation {message.from_user.id}")
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
     try:
-        cursor.execute("SELECT word, translation FROM user_dictionary WHERE topic_id = ? AND user_id = ?",
-                       (topic_id, user_id))
-        words = cursor.fetchall()
-        if words:
-            word, translation = random.choice(words)
+        # Слово из очереди сессии: база читается один раз на пачку слов
+        card = await current_card(user_id, topic_id)
+        if card:
+            word, translation = card
             stop_kb = ReplyKeyboardMarkup(
                 keyboard=[[KeyboardButton(text="Прекратить повтор")]]
             )
             await message.answer(f"Слово: <b>{word}</b>\nНапишите перевод на русском:", parse_mode='HTML', reply_markup=stop_kb, resize_keyboard=True)
-            await state.update_data(current_word=word, current_translation=translation)
+            await state.update_data(current_word=word, current_translation=translation, current_failed=False)
         else:
             await message.answer("В этой теме нет слов.")
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
         await message.answer("Произошла ошибка при получении слов.")
-    finally:
-        conn.close()
 
 @repeat_words_router.message(lambda message: message.text.strip() != "Прекратить повтор", TranslationStates.ENG_RU)
 async def check_eng_ru_translation(message: types.Message, state: FSMContext):
@@ -252,7 +243,11 @@ async def check_eng_ru_translation(message: types.Message, state: FSMContext):
 
     logging.info(f"User input: '{message.text.strip().lower()}', Expected: '{current_translation.lower()}'")
 
-    if message.text.strip().lower() == current_translation.strip().lower():
+    correct = message.text.strip().lower() == current_translation.strip().lower()
+    await grade_answer(message, state, data, correct)
+
+    if correct:
+        next_question(message, data)
         await message.answer("Правильно!")
         await ask_for_ru_translation(message, message.from_user.id, data.get('topic_id'), state)
     else:
@@ -264,43 +259,39 @@ async def check_eng_ru_translation(message: types.Message, state: FSMContext):
 
 
 
-@repeat_words_router.callback_query(lambda c: c.data.startswith("ru_eng:"))
-async def start_ru_eng_translation(callback_query: types.CallbackQuery, state: FSMContext):
+@callback_handler(NS.RU_ENG)
+async def start_ru_eng_translation(callback_query: types.CallbackQuery, state: FSMContext, callback_args: tuple):
     logging.info(f"start_ru_eng_translation {callback_query.from_user.id}")
     await state.clear()
-    topic_id = callback_query.data.split(":")[1]
+    topic_id, = callback_args
     user_id = callback_query.from_user.id
     await state.update_data(topic_id=topic_id)
     await state.set_state(TranslationStates.RU_ENG)
+    reset_session(user_id, topic_id)
     await ask_for_eng_translation(callback_query.message, user_id, topic_id, state)
 
 @repeat_words_router.message(F.text=='ask_for_eng_translation')
 async def ask_for_eng_translation(message: types.Message, user_id: int, topic_id: int, state: FSMContext):
     logging.info(f"ask_for_eng_translation {message.from_user.id}")
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
 
     try:
-        cursor.execute("SELECT translation, word FROM user_dictionary WHERE topic_id = ? AND user_id = ?",
-                       (topic_id, user_id))
-        words = cursor.fetchall()
+        # Слово из очереди сессии: база читается один раз на пачку слов
+        card = await current_card(user_id, topic_id)
 
-        if words:
-            translation, word = random.choice(words)  # translation - русское, word - английское
+        if card:
+            word, translation = card  # translation - русское, word - английское
 
             stop_kb = ReplyKeyboardMarkup(
                 keyboard=[[KeyboardButton(text="Прекратить повтор")]]
             )
 
             await message.answer(f"Слово: <b>{translation}</b>\nНапишите перевод на английском:", parse_mode='HTML', reply_markup=stop_kb, resize_keyboard=True)
-            await state.update_data(current_word=word, current_translation=translation)
+            await state.update_data(current_word=word, current_translation=translation, current_failed=False)
         else:
             await message.answer("В этой теме нет слов.")
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
         await message.answer("Произошла ошибка при получении слов.")
-    finally:
-        conn.close()
 
 @repeat_words_router.message(lambda message: message.text.strip() != "Прекратить повтор", TranslationStates.RU_ENG)
 async def check_ru_eng_translation(message: types.Message, state: FSMContext):
@@ -308,7 +299,11 @@ async def check_ru_eng_translation(message: types.Message, state: FSMContext):
     data = await state.get_data()
     current_word = data.get('current_word')  # Это английское слово
 
-    if current_word and message.text.strip().lower() == current_word.lower():
+    correct = bool(current_word) and message.text.strip().lower() == current_word.lower()
+    await grade_answer(message, state, data, correct)
+
+    if correct:
+        next_question(message, data)
         await message.answer("Правильно!")
         await ask_for_eng_translation(message, message.from_user.id, data.get('topic_id'), state)
     else:
@@ -318,121 +313,56 @@ async def check_ru_eng_translation(message: types.Message, state: FSMContext):
         await message.answer("Неправильно. Попробуйте еще раз.", reply_markup=stop_kb, resize_keyboard=True)
 
 
-@repeat_words_router.callback_query(F.data.startswith("show_words:"))
-async def show_words(callback_query: types.CallbackQuery) -> None:
-    topic_id = int(callback_query.data.split(":")[1])
+@callback_handler(NS.SHOW_WORDS)
+async def show_words(callback_query: types.CallbackQuery, callback_args: tuple) -> None:
+    topic_id, = callback_args
+    await send_word_page(callback_query, topic_id, 0)
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
 
+# Функция для показа страницы слов темы
+async def send_word_page(callback_query: types.CallbackQuery, topic_id: int, page: int) -> None:
     try:
-        # Получаем имя темы по topic_id
-        cursor.execute("SELECT content FROM topics WHERE id = ?", (topic_id,))
-        topic = cursor.fetchone()
-        topic_name = topic[0] if topic else None
+        pages = await get_topic_pages(topic_id)
 
-        if not topic_name:
+        if pages is None:
             await callback_query.answer("Тема не найдена.", show_alert=True)
             return
 
-        cursor.execute("SELECT word, translation FROM user_dictionary WHERE topic_id = ?", (topic_id,))
-        words = cursor.fetchall()
-
-        words = [(word[0], word[1]) for word in words]
-
-        if not words:
+        if not pages.word_count:
             await callback_query.answer("В этой теме нет слов.", show_alert=True)
             return
 
-        current_page = 0
-        await send_word_page(callback_query.message, words, current_page, topic_id, topic_name)
+        word_page = await pages.page(page)
+        await callback_query.message.edit_text(word_page.text, reply_markup=word_page.reply_markup)
 
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
         await callback_query.answer("Произошла ошибка при получении слов.", show_alert=True)
-    finally:
-        conn.close()
-
-
-
-async def send_word_page(message: types.Message, words: list, page: int, topic_id: int, topic_name: str) -> None:
-    words_per_page = 15
-    start_index = page * words_per_page
-    end_index = start_index + words_per_page
-
-    words_to_display = words[start_index:end_index]
-    words_text = "\n".join(
-        f"{i + 1 + start_index}. {word} - {translation}" for i, (word, translation) in enumerate(words_to_display))
 
-    # Создаем клавиатуру для навигации
-    nav_kb = []
-    if page > 0:
-        nav_kb.append(InlineKeyboardButton(text="Назад", callback_data=f"word_page:{page - 1}:{topic_id}"))
-    if end_index < len(words):
-        nav_kb.append(InlineKeyboardButton(text="Вперёд", callback_data=f"word_page:{page + 1}:{topic_id}"))
 
-    # Создаем клавиатуру для удаления слова
-    delete_kb = [[InlineKeyboardButton(text="Удалить слово", callback_data=f"delete_word:{topic_id}")]]
-    go_back = [[InlineKeyboardButton(text="Назад", callback_data=f"go_back:{topic_name}")]]
-    # Объединяем навигационную клавиатуру с клавиатурой для удаления
-    full_kb = InlineKeyboardMarkup(inline_keyboard=[nav_kb, *delete_kb, *go_back])
-
-    await message.edit_text(f"Слова:\n{words_text}", reply_markup=full_kb)
-
-
-@repeat_words_router.callback_query(F.data.startswith("go_back:"))
-async def go_back_theme(callback_query: types.CallbackQuery, state: FSMContext) -> None:
-    # Получаем имя темы из callback_data
-    topic_name = callback_query.data.split(":")[1]
-
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+@callback_handler(NS.GO_BACK)
+async def go_back_theme(callback_query: types.CallbackQuery, state: FSMContext, callback_args: tuple) -> None:
+    # В callback_data id темы; в старых кнопках вместо него было название
+    topic_ref, = callback_args
 
     try:
-        cursor.execute("SELECT id, visible, author_id FROM topics WHERE content = ?", (topic_name,))
-        topic = cursor.fetchone()
-
-        if topic:
-            current_topic_id, is_visible, author_id = topic
-
-            # Получаем информацию об авторе
-            cursor.execute("SELECT full_name FROM users WHERE user_id = ?", (author_id,))
-            author = cursor.fetchone()
-            author_username = author[0] if author else "Неизвестный автор"
+        card = await get_topic_card(topic_ref)
 
-            cursor.execute("SELECT COUNT(*) FROM user_dictionary WHERE topic_id = ?", (current_topic_id,))
-            word_count = cursor.fetchone()[0]
-
-            # Создаем ссылку на профиль автора
-            author_link = f"[{author_username}](tg://user?id={author_id})"
-
-            message_text = f"Название темы: *{topic_name}*\nКоличество слов: {word_count}\nАвтор: {author_link}"
-            # message_text = f"Название темы: *{topic_name}*\nКоличество слов: {word_count}\nСтатус: {'Публичная' if is_visible else 'Приватная'}\nАвтор: {author_link}"
-
-
-            kb = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="RU-ENG", callback_data=f"ru_eng:{current_topic_id}"),
-                 InlineKeyboardButton(text="ENG-RU", callback_data=f"eng_ru:{current_topic_id}")],
-                [InlineKeyboardButton(text="Слова в теме", callback_data=f"show_words:{current_topic_id}")]
-                # [InlineKeyboardButton(text="Сделать приватной" if is_visible else "Сделать публичной",
-                #                       callback_data=f"toggle_visibility:{current_topic_id}")]
-            ])
-            await callback_query.message.answer(message_text, parse_mode='Markdown', reply_markup=kb)
+        if card:
+            await callback_query.message.answer(card.text, parse_mode='Markdown', reply_markup=card.review_markup)
             await state.clear()
         else:
             await callback_query.answer("Тема не найдена.")
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
         await callback_query.answer("Произошла ошибка при получении данных.")
-    finally:
-        conn.close()
 
 
 
 
-@repeat_words_router.callback_query(F.data.startswith("delete_word:"))
-async def delete_word(callback_query: types.CallbackQuery, state: FSMContext) -> None:
-    topic_id = int(callback_query.data.split(":")[1])
+@callback_handler(NS.DELETE_WORD)
+async def delete_word(callback_query: types.CallbackQuery, state: FSMContext, callback_args: tuple) -> None:
+    topic_id, = callback_args
 
     kb = [
         [KeyboardButton(text="Отменить действие")],
@@ -453,15 +383,13 @@ async def process_delete_word(message: types.Message, state: FSMContext) -> None
     topic_id = data.get('topic_id')
     user_id = message.from_user.id  # Получаем user_id
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
     try:
         # Проверяем наличие слова в базе данных
-        cursor.execute("DELETE FROM user_dictionary WHERE user_id = ? AND topic_id = ? AND word = ?",
-                       (user_id, topic_id, input_text))
-        if cursor.rowcount > 0:
-            conn.commit()
+        deleted = await db.write("DELETE FROM user_dictionary WHERE user_id = ? AND topic_id = ? AND word = ?",
+                                 (user_id, topic_id, input_text))
+        if deleted > 0:
+            topic_changed(topic_id)
+            await refresh_leaderboard(user_id, await count_changed(user_id, words=-1))
             kb = [
                 [KeyboardButton(text="Словарь"), KeyboardButton(text="Профиль")],
                 [KeyboardButton(text="Повторение слов")],
@@ -469,7 +397,6 @@ async def process_delete_word(message: types.Message, state: FSMContext) -> None
             ]
             keyboard = ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True)
             await message.answer(f'Слово "{input_text}" успешно удалено.', reply_markup=keyboard)
-            await update_learned_words_count(user_id)
 
         else:
             kb = [
@@ -479,41 +406,16 @@ async def process_delete_word(message: types.Message, state: FSMContext) -> None
             ]
             keyboard = ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True)
             await message.answer(f'Слово "{input_text}" не найдено.', reply_markup=keyboard)
-            await update_learned_words_count(user_id)
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
         await message.answer("Произошла ошибка при удалении слова.")
-        await update_learned_words_count(user_id)
     finally:
-        conn.close()
-        await update_learned_words_count(user_id)
         await state.clear()  # Завершение состояния
 
 
 
-@repeat_words_router.callback_query(F.data.startswith("word_page:"))
-async def navigate_words(callback_query: types.CallbackQuery) -> None:
-    _, page_str, topic_id_str = callback_query.data.split(":")
-    page = int(page_str)
-    topic_id = int(topic_id_str)
+@callback_handler(NS.WORD_PAGE)
+async def navigate_words(callback_query: types.CallbackQuery, callback_args: tuple) -> None:
+    page, topic_id = callback_args
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    try:
-        cursor.execute("SELECT word, translation FROM user_dictionary WHERE topic_id = ?", (topic_id,))
-        words = cursor.fetchall()
-
-        words = [(word[0], word[1]) for word in words]
-
-        if not words:
-            await callback_query.answer("В этой теме нет слов.", show_alert=True)
-            return
-
-        await send_word_page(callback_query.message, words, page, topic_id)
-
-    except sqlite3.Error as e:
-        logging.error(f"Database error: {e}")
-        await callback_query.answer("Произошла ошибка при получении слов.", show_alert=True)
-    finally:
-        conn.close()
+    await send_word_page(callback_query, topic_id, page)
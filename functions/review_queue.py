@@ -0,0 +1,96 @@
+import itertools
+import random
+from collections import deque
+from typing import Optional
+
+from cache import LRUCache, on_topic_changed
+from database import db
+from functions.spaced_repetition import ReviewCard
+
+# Сколько слов загружать в очередь за один запрос
+QUEUE_BATCH_SIZE = 100
+# Через сколько вопросов вернуть слово, на котором пользователь ошибся
+RELEARN_GAP = 3
+# Сколько сессий держать в памяти и сколько секунд хранить брошенную сессию
+MAX_SESSIONS = 10000
+SESSION_TTL = 30 * 60
+
+
+class ReviewSession:
+    """Очередь слов одной сессии повторения.
+
+    Слова загружаются одним запросом в порядке due_at (слова с одинаковым
+    сроком перемешаны), и дальше вопросы берутся из памяти без обращения
+    к базе. Если слова темы изменились, сессия перестаёт быть актуальной.
+    """
+
+    __slots__ = ("version", "queue")
+
+    def __init__(self, version: int, cards: list[ReviewCard]) -> None:
+        self.version = version
+        self.queue: deque[ReviewCard] = deque(cards)
+
+    def current(self) -> Optional[ReviewCard]:
+        return self.queue[0] if self.queue else None
+
+    def advance(self, word: str, relearn: bool) -> None:
+        if not self.queue or self.queue[0].word != word:
+            return
+        card = self.queue.popleft()
+        if relearn:
+            self.queue.insert(min(RELEARN_GAP, len(self.queue)), card)
+
+
+_sessions = LRUCache(MAX_SESSIONS, ttl=SESSION_TTL)
+# Версия слов темы: меняется при каждом изменении, старые сессии по ней отбрасываются.
+# Номера берутся из общего счётчика, поэтому после вытеснения темы из кэша старая
+# сессия не совпадёт с новой версией и просто перезагрузится.
+_topic_versions = LRUCache(MAX_SESSIONS)
+_version_counter = itertools.count(1)
+
+
+@on_topic_changed
+def _bump_topic_version(topic_id: int) -> None:
+    _topic_versions.set(topic_id, next(_version_counter))
+
+
+async def _load_cards(user_id: int, topic_id: int) -> list[ReviewCard]:
+    rows = await db.fetchall("""
+        SELECT r.word, d.translation, r.due_at
+        FROM word_reviews r
+        JOIN user_dictionary d ON d.user_id = r.user_id AND d.topic_id = r.topic_id AND d.word = r.word
+        WHERE r.user_id = ? AND r.topic_id = ?
+        ORDER BY r.due_at
+        LIMIT ?
+    """, (user_id, topic_id, QUEUE_BATCH_SIZE))
+    random.shuffle(rows)
+    rows.sort(key=lambda row: row[2])
+    return [ReviewCard(word, translation) for word, translation, _ in rows]
+
+
+# Функция для сброса сессии: следующий вопрос загрузит очередь заново
+def reset_session(user_id: int, topic_id: int) -> None:
+    _sessions.pop((user_id, topic_id))
+
+
+# Функция для загрузки слов новой сессии повторения
+async def start_session(user_id: int, topic_id: int) -> ReviewSession:
+    version = _topic_versions.get(topic_id, 0)
+    session = ReviewSession(version, await _load_cards(user_id, topic_id))
+    _sessions.set((user_id, topic_id), session)
+    return session
+
+
+# Функция для получения текущего слова сессии; база читается, только если очередь закончилась или устарела
+async def current_card(user_id: int, topic_id: int) -> Optional[ReviewCard]:
+    session = _sessions.get((user_id, topic_id))
+    if session is None or session.version != _topic_versions.get(topic_id, 0) or not session.queue:
+        session = await start_session(user_id, topic_id)
+    return session.current()
+
+
+# Функция для перехода к следующему слову после верного ответа
+def advance(user_id: int, topic_id: int, word: str, relearn: bool) -> None:
+    session = _sessions.get((user_id, topic_id))
+    if session is not None:
+        session.advance(word, relearn)
@@ -0,0 +1,80 @@
+import time
+from typing import NamedTuple
+
+from database import db
+
+# Параметры алгоритма SM-2
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+EASE_PENALTY = 0.2
+FIRST_INTERVAL_DAYS = 1
+SECOND_INTERVAL_DAYS = 6
+# Через сколько секунд снова показать слово, на котором пользователь ошибся
+RELEARN_DELAY = 60
+# Сколько раз перечитать карточку, если её изменили одновременно с ответом
+REVIEW_WRITE_ATTEMPTS = 3
+
+DAY = 24 * 60 * 60
+
+
+class ReviewCard(NamedTuple):
+    word: str
+    translation: str
+
+
+class ReviewState(NamedTuple):
+    due_at: float
+    interval_days: float
+    ease: float
+    repetitions: int
+    lapses: int
+
+
+# Функция для расчёта следующего состояния карточки по результату ответа
+def schedule(state: ReviewState, correct: bool, now: float) -> ReviewState:
+    if not correct:
+        return ReviewState(
+            due_at=now + RELEARN_DELAY,
+            interval_days=0,
+            ease=max(MIN_EASE, state.ease - EASE_PENALTY),
+            repetitions=0,
+            lapses=state.lapses + 1,
+        )
+
+    if state.repetitions == 0:
+        interval = FIRST_INTERVAL_DAYS
+    elif state.repetitions == 1:
+        interval = SECOND_INTERVAL_DAYS
+    else:
+        interval = state.interval_days * state.ease
+    return ReviewState(
+        due_at=now + interval * DAY,
+        interval_days=interval,
+        ease=state.ease,
+        repetitions=state.repetitions + 1,
+        lapses=state.lapses,
+    )
+
+
+# Функция для сохранения результата ответа пользователя.
+# Запись идёт через общую очередь записи; UPDATE применяется, только если строку
+# не изменили после чтения, иначе состояние перечитывается.
+async def record_review(user_id: int, topic_id: int, word: str, correct: bool) -> None:
+    for _ in range(REVIEW_WRITE_ATTEMPTS):
+        row = await db.fetchone("""
+            SELECT due_at, interval_days, ease, repetitions, lapses
+            FROM word_reviews
+            WHERE user_id = ? AND topic_id = ? AND word = ?
+        """, (user_id, topic_id, word))
+        if row is None:
+            return
+
+        old = ReviewState(*row)
+        state = schedule(old, correct, time.time())
+        updated = await db.write("""
+            UPDATE word_reviews
+            SET due_at = ?, interval_days = ?, ease = ?, repetitions = ?, lapses = ?
+            WHERE user_id = ? AND topic_id = ? AND word = ? AND due_at = ? AND repetitions = ? AND lapses = ?
+        """, (*state, user_id, topic_id, word, old.due_at, old.repetitions, old.lapses))
+        if updated:
+            return
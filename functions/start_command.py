@@ -5,23 +5,20 @@ from aiogram import types, Bot, Router, F
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
-from shared import dp, DB_FILE, create_connection, TranslationStates, TOKEN, update_learned_words_count, \
-    update_learned_topics_count
-from aiogram.client.session.aiohttp import AiohttpSession
+from callbacks import NS, callback_handler, pack
+from database import db
+from functions.leaderboard import refresh_leaderboard
+from functions.user_profiles import get_profile, save_profile
+from shared import dp, TranslationStates
 
-session = AiohttpSession(proxy="http://proxy.server:3128")
-bot = Bot(token=TOKEN, session=session)
 start_router = Router()
 
 @start_router.message(F.text.startswith("/start"))
 async def start_command_handler(message: types.Message, state: FSMContext):
     command = message.text.split(maxsplit=1)
-    user_id = message.from_user.id
     referral_code = command[1] if len(command) > 1 else None
     if referral_code and referral_code.startswith('='):
         referral_code = referral_code[1:]  # Удаляем '=' если есть
-    await update_learned_words_count(user_id)
-    await update_learned_topics_count(user_id)
     await process_start_command(message, referral_code, state, upsert_user)
 
 async def process_start_command(message: types.Message, referral_code: str, state: FSMContext, upsert_user_func) -> None:
@@ -30,7 +27,7 @@ async def process_start_command(message: types.Message, referral_code: str, stat
 
     logging.info(f"Referral code: {referral_code}")
 
-    button = InlineKeyboardButton(text="Начать обучение!", callback_data="start_learning")
+    button = InlineKeyboardButton(text="Начать обучение!", callback_data=pack(NS.START_LEARNING))
     keyboard = InlineKeyboardMarkup(inline_keyboard=[[button]])
 
     await message.answer("Добро пожаловать! Нажмите кнопку ниже, чтобы начать изучение:", reply_markup=keyboard)
@@ -44,10 +41,11 @@ async def process_start_command(message: types.Message, referral_code: str, stat
 
         referrer_id = await get_user_id_by_referral_code(referral_code) if referral_code else None
 
-        # Вставляем или обновляем пользователя
-        await upsert_user_func(message.from_user.id, message.from_user.username or '', full_name, referral_code, referrer_id)
-
-        logging.info(f"User data updated for {message.from_user.id}")
+        # Вставляем пользователя или обновляем его имя, если оно изменилось
+        if await upsert_user_func(message.from_user.id, message.from_user.username or '', full_name,
+                                  referral_code, referrer_id):
+            logging.info(f"User data updated for {message.from_user.id}")
+            await refresh_leaderboard(message.from_user.id, await get_profile(message.from_user.id))
 
         # Проверка, есть ли реферальный код и обновление статуса
         if referrer_id:
@@ -59,39 +57,27 @@ async def process_start_command(message: types.Message, referral_code: str, stat
 
 async def update_elite_status(user_id: int) -> None:
     """Обновляем статус элиты у пользователя."""
-    conn = create_connection(DB_FILE)
     try:
-        cursor = conn.cursor()
         # Проверяем, если статус элиты еще не установлен
-        cursor.execute("SELECT elite_status FROM users WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
+        result = await db.fetchone("SELECT elite_status FROM users WHERE user_id = ?", (user_id,))
 
         if result and result[0] != 'Yes':
-            cursor.execute("UPDATE users SET elite_status = 'Yes', elite_start_date = ? WHERE user_id = ?",
+            await db.write("UPDATE users SET elite_status = 'Yes', elite_start_date = ? WHERE user_id = ?",
                            (datetime.datetime.now(), user_id))
-            conn.commit()
             logging.info(f"User {user_id} granted elite status.")
     except sqlite3.Error as e:
         logging.error(f"Database error while updating elite status: {e}")
-    finally:
-        conn.close()
 
 async def get_user_id_by_referral_code(referral_code: str) -> int:
     """Получаем user_id по реферальному коду"""
-    conn = create_connection(DB_FILE)
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id FROM users WHERE referral_code = ?", (referral_code,))
-        result = cursor.fetchone()
-        return result[0] if result else None
+        return await db.fetchval("SELECT user_id FROM users WHERE referral_code = ?", (referral_code,))
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
         return None
-    finally:
-        conn.close()
 
-@start_router.callback_query(lambda c: c.data == 'start_learning')
-async def process_start_learning(callback_query: types.CallbackQuery) -> None:
+@callback_handler(NS.START_LEARNING)
+async def process_start_learning(callback_query: types.CallbackQuery, bot: Bot) -> None:
     logging.info(f"process_start_learning {callback_query.from_user.id}")
     user_id = callback_query.from_user.id
     await bot.answer_callback_query(callback_query.id)
@@ -105,40 +91,16 @@ async def process_start_learning(callback_query: types.CallbackQuery) -> None:
 
     await bot.send_message(user_id, "Выберите интересующий вас раздел:", reply_markup=keyboard)
 
+# Функция для добавления пользователя или обновления его имени; счётчики и статус не перезаписываются.
+# Возвращает True, если строка в базе изменилась.
 async def upsert_user(user_id: int, username_tg: str, full_name: str, referral_code: str = None,
-                      referrer_id: int = None, balance: int = 0, elite_status: str = 'No',
-                      learned_words_count: int = 0, elite_start_date: str = None) -> None:
-    conn = create_connection(DB_FILE)
-    try:
-        cursor = conn.cursor()
-        unique_referral_code = str(user_id)
-
-        cursor.execute("""INSERT INTO users (user_id, username_tg, full_name, balance, elite_status, learned_words_count, referral_code, referred_by, elite_start_date)
-                          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                          ON CONFLICT(user_id) DO UPDATE SET
-                              username_tg = excluded.username_tg,
-                              full_name = excluded.full_name,
-                              balance = excluded.balance,
-                              elite_status = excluded.elite_status,
-                              learned_words_count = excluded.learned_words_count,
-                              referral_code = excluded.referral_code,
-                              referred_by = excluded.referred_by,
-                              elite_start_date = excluded.elite_start_date
-                       """, (
-            user_id, username_tg, full_name, balance, elite_status, learned_words_count, unique_referral_code,
-            referrer_id, elite_start_date))
-        conn.commit()
-    except sqlite3.Error as e:
-        logging.error(f"Database error: {e}")
-    finally:
-        conn.close()
+                      referrer_id: int = None) -> bool:
+    return await save_profile(user_id, username_tg, full_name, referrer_id)
 
 async def check_elite_status(user_id: int) -> str:
-    conn = create_connection(DB_FILE)
+    elite_start_date = None
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT elite_status, elite_start_date FROM users WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
+        result = await db.fetchone("SELECT elite_status, elite_start_date FROM users WHERE user_id = ?", (user_id,))
 
         if result:
             elite_status, elite_start_date = result
@@ -146,8 +108,7 @@ async def check_elite_status(user_id: int) -> str:
                 # Попробуем распарсить дату с миллисекундами
                 start_date = datetime.datetime.strptime(elite_start_date.split('.')[0], '%Y-%m-%d %H:%M:%S')
                 if (datetime.datetime.now() - start_date).days >= 3:
-                    cursor.execute("UPDATE users SET elite_status = 'No', elite_start_date = NULL WHERE user_id = ?", (user_id,))
-                    conn.commit()
+                    await db.write("UPDATE users SET elite_status = 'No', elite_start_date = NULL WHERE user_id = ?", (user_id,))
                     logging.info(f"User {user_id} elite status expired.")
                     return 'No'
             return elite_status
@@ -157,8 +118,6 @@ async def check_elite_status(user_id: int) -> str:
     except ValueError as ve:
         logging.error(f"Value error: {ve} for user_id {user_id} with elite_start_date {elite_start_date}")
         return 'No'
-    finally:
-        conn.close()
 
 
 @start_router.message(F.text.startswith("/menu"))
@@ -0,0 +1,98 @@
+from typing import NamedTuple, Optional, Union
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from cache import LRUCache, on_topic_changed, on_topic_list_changed, on_user_changed
+from callbacks import NS, pack
+from database import db
+from functions.user_profiles import get_profile
+
+# Для скольких тем держать готовые карточки
+MAX_CACHED_CARDS = 5000
+
+# Тема и число слов (поддерживается триггерами) по индексу idx_topics_content или
+# первичному ключу; имя автора берётся из кэша профилей
+TOPIC_CARD_SQL = """
+    SELECT id, content, author_id, word_count
+    FROM topics
+    WHERE {column} = ?
+    LIMIT 1
+"""
+
+
+class TopicCard(NamedTuple):
+    topic_id: int
+    topic_name: str
+    author_id: int
+    word_count: int
+    text: str
+    # Клавиатура раздела "Словарь": добавление, импорт, экспорт и удаление
+    manage_markup: InlineKeyboardMarkup
+    # Клавиатура раздела "Повторение слов"
+    review_markup: InlineKeyboardMarkup
+
+
+# Функция для формирования карточки темы
+def render_topic_card(topic_id: int, topic_name: str, author_id: int, word_count: int,
+                      author_name: Optional[str]) -> TopicCard:
+    author_link = f"[{author_name or 'Неизвестный автор'}](tg://user?id={author_id})"
+    text = (f"Название темы: *{topic_name}*\n"
+            f"Количество слов: {word_count}\n"
+            # f"Статус: {'Публичная' if is_visible else 'Приватная'}\n"
+            f"Автор: {author_link}")
+
+    manage_markup = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="Добавить слово", callback_data=pack(NS.ADD_WORDS, topic_id)),
+         InlineKeyboardButton(text="Удалить тему", callback_data=pack(NS.DELETE_TOPIC, topic_id))],
+        [InlineKeyboardButton(text="Импорт списка слов", callback_data=pack(NS.IMPORT_WORDS, topic_id))],
+        [InlineKeyboardButton(text="Экспорт в CSV", callback_data=pack(NS.EXPORT_TOPIC, topic_id, "csv")),
+         InlineKeyboardButton(text="Экспорт для Anki", callback_data=pack(NS.EXPORT_TOPIC, topic_id, "anki"))],
+        [InlineKeyboardButton(text="Слова в теме", callback_data=pack(NS.SHOW_WORDS, topic_id))],
+    ])
+    review_markup = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="RU-ENG", callback_data=pack(NS.RU_ENG, topic_id)),
+         InlineKeyboardButton(text="ENG-RU", callback_data=pack(NS.ENG_RU, topic_id))],
+        [InlineKeyboardButton(text="Слова в теме", callback_data=pack(NS.SHOW_WORDS, topic_id))],
+    ])
+    return TopicCard(topic_id, topic_name, author_id, word_count, text, manage_markup, review_markup)
+
+
+_cards = LRUCache(MAX_CACHED_CARDS)
+# Название темы -> id; сбрасывается при создании и удалении тем
+_topic_ids = LRUCache(MAX_CACHED_CARDS)
+
+
+@on_topic_changed
+def _drop_topic_card(topic_id: int) -> None:
+    _cards.pop(topic_id)
+
+
+@on_topic_list_changed
+def _drop_topic_ids() -> None:
+    _topic_ids.clear()
+
+
+@on_user_changed
+def _drop_author_cards(user_id: int) -> None:
+    # Имя меняется редко, поэтому проще перестроить все карточки, чем искать темы автора
+    _cards.clear()
+
+
+# Функция для получения карточки темы по id или по названию; None, если темы нет
+async def get_topic_card(topic_ref: Union[int, str]) -> Optional[TopicCard]:
+    topic_id = topic_ref if isinstance(topic_ref, int) else _topic_ids.get(topic_ref)
+    if topic_id is not None:
+        card = _cards.get(topic_id)
+        if card is not None:
+            return card
+
+    column = "id" if isinstance(topic_ref, int) else "content"
+    row = await db.fetchone(TOPIC_CARD_SQL.format(column=column), (topic_ref,))
+    if row is None:
+        return None
+    topic_id, topic_name, author_id, word_count = row
+    author = await get_profile(author_id)
+    card = render_topic_card(topic_id, topic_name, author_id, word_count or 0, author.full_name if author else None)
+    _cards.set(topic_id, card)
+    _topic_ids.set(topic_name, topic_id)
+    return card
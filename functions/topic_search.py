@@ -0,0 +1,81 @@
+import logging
+from typing import Optional
+
+from database import db
+
+# Telegram показывает не больше 50 результатов инлайн-запроса
+MAX_TOPIC_RESULTS = 50
+# Токенизатор trigram находит только подстроки длиной от трёх символов
+MIN_FTS_QUERY_LENGTH = 3
+
+_fts_available: Optional[bool] = None
+
+
+async def _has_fts() -> bool:
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = await db.fetchone(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='topics_fts'") is not None
+        if not _fts_available:
+            logging.warning("topics_fts is missing, topic search falls back to LIKE")
+    return _fts_available
+
+
+def _fts_phrase(query: str) -> str:
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+async def _search_fts(user_id: int, query: str, limit: int) -> list:
+    phrase = _fts_phrase(query)
+    # Как и в _search_like, два запроса со своими LIMIT: сортировку по rank выполняет
+    # сам индекс FTS5, без сортировки всех совпадений во временном B-дереве
+    own = await db.fetchall("""
+        SELECT t.id, t.content
+        FROM topics_fts f
+        JOIN topics t ON t.id = f.rowid
+        WHERE topics_fts MATCH ? AND t.author_id = ?
+        ORDER BY f.rank
+        LIMIT ?
+    """, (phrase, user_id, limit))
+    if len(own) >= limit:
+        return own
+    public = await db.fetchall("""
+        SELECT t.id, t.content
+        FROM topics_fts f
+        JOIN topics t ON t.id = f.rowid
+        WHERE topics_fts MATCH ? AND t.visible = 1 AND t.author_id != ?
+        ORDER BY f.rank
+        LIMIT ?
+    """, (phrase, user_id, limit - len(own)))
+    return own + public
+
+
+async def _search_like(user_id: int, query: str, limit: int) -> list:
+    pattern = _like_pattern(query)
+    # Свои темы берутся по индексу автора, публичные — до первых limit совпадений
+    own = await db.fetchall("""
+        SELECT id, content FROM topics
+        WHERE author_id = ? AND content LIKE ? ESCAPE '\\'
+        LIMIT ?
+    """, (user_id, pattern, limit))
+    if len(own) >= limit:
+        return own
+    public = await db.fetchall("""
+        SELECT id, content FROM topics
+        WHERE visible = 1 AND author_id != ? AND content LIKE ? ESCAPE '\\'
+        LIMIT ?
+    """, (user_id, pattern, limit - len(own)))
+    return own + public
+
+
+# Функция для поиска тем, доступных пользователю: сначала свои, затем публичные
+async def search_topics(user_id: int, query: str, limit: int = MAX_TOPIC_RESULTS) -> list:
+    query = query.strip()
+    if len(query) >= MIN_FTS_QUERY_LENGTH and await _has_fts():
+        return await _search_fts(user_id, query, limit)
+    return await _search_like(user_id, query, limit)
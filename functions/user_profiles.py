@@ -0,0 +1,93 @@
+import logging
+import sqlite3
+from typing import NamedTuple, Optional
+
+from cache import LRUCache, user_changed
+from database import db
+
+# Для скольких пользователей держать в памяти имя и реферера
+MAX_CACHED_PROFILES = 50000
+
+
+class UserProfile(NamedTuple):
+    username_tg: str
+    full_name: str
+    referred_by: Optional[int]
+    learned_words_count: int = 0
+    topics_count: int = 0
+
+
+# Значение в кэше для пользователя, которого нет в базе
+_MISSING = UserProfile("", "", None)
+
+_profiles = LRUCache(MAX_CACHED_PROFILES)
+
+# Обновляет только имя и username; балансы, статус и счётчики не трогает.
+# Реферер записывается один раз. Если ничего не изменилось, строка не перезаписывается.
+UPSERT_PROFILE_SQL = """
+    INSERT INTO users (user_id, username_tg, full_name, referral_code, referred_by)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        username_tg = excluded.username_tg,
+        full_name = excluded.full_name,
+        referred_by = COALESCE(users.referred_by, excluded.referred_by)
+    WHERE users.username_tg IS NOT excluded.username_tg
+       OR users.full_name IS NOT excluded.full_name
+       OR (users.referred_by IS NULL AND excluded.referred_by IS NOT NULL)
+"""
+
+
+# Функция для получения профиля пользователя из кэша или базы; None, если пользователя нет
+async def get_profile(user_id: int) -> Optional[UserProfile]:
+    profile = _profiles.get(user_id)
+    if profile is None:
+        row = await db.fetchone("""SELECT username_tg, full_name, referred_by, learned_words_count, topics_count
+                                   FROM users WHERE user_id = ?""", (user_id,))
+        # Пока шёл запрос, профиль мог записать обработчик, который уже знает новые значения
+        profile = _profiles.get(user_id)
+        if profile is None:
+            profile = UserProfile(row[0] or "", row[1] or "", row[2], row[3] or 0, row[4] or 0) if row else _MISSING
+            _profiles.set(user_id, profile)
+    return profile if profile is not _MISSING else None
+
+
+# Функция для учёта изменения счётчиков слов и тем после записи в базу; возвращает профиль с новыми значениями.
+# Счётчики в базе меняют триггеры, поэтому кэш обновляется здесь же, без повторного чтения.
+async def count_changed(user_id: int, words: int = 0, topics: int = 0) -> Optional[UserProfile]:
+    profile = _profiles.get(user_id)
+    if profile is None:
+        return await get_profile(user_id)  # Запись уже закоммичена, из базы читается новое значение
+    if profile is _MISSING:
+        return None
+    profile = profile._replace(learned_words_count=max(profile.learned_words_count + words, 0),
+                               topics_count=max(profile.topics_count + topics, 0))
+    _profiles.set(user_id, profile)
+    return profile
+
+
+# Функция для сброса кэша, когда счётчики изменились у многих пользователей сразу
+def forget_profiles() -> None:
+    _profiles.clear()
+
+
+# Функция для сохранения имени пользователя; возвращает True, если строка в базе изменилась
+async def save_profile(user_id: int, username_tg: str, full_name: str, referrer_id: Optional[int] = None) -> bool:
+    try:
+        cached = await get_profile(user_id)
+        if (cached is not None and cached.username_tg == username_tg and cached.full_name == full_name
+                and (referrer_id is None or cached.referred_by is not None)):
+            return False
+        changed = await db.write(UPSERT_PROFILE_SQL, (user_id, username_tg, full_name, str(user_id), referrer_id))
+    except sqlite3.Error as e:
+        logging.error(f"Database error: {e}")
+        _profiles.pop(user_id)
+        return False
+    if cached is None:
+        # Новая строка: счётчики по умолчанию равны нулю
+        _profiles.set(user_id, UserProfile(username_tg, full_name, referrer_id))
+    else:
+        referred_by = cached.referred_by if cached.referred_by is not None else referrer_id
+        _profiles.set(user_id, cached._replace(username_tg=username_tg, full_name=full_name, referred_by=referred_by))
+    if changed and cached is not None and cached.full_name != full_name:
+        user_changed(user_id)
+    return changed > 0
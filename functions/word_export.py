@@ -0,0 +1,94 @@
+import asyncio
+import csv
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+from typing import AsyncIterator
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import FSInputFile
+
+from database import db
+from outbound import BULK, send_priority
+
+# Сколько строк читать из базы за раз
+EXPORT_BATCH_SIZE = 500
+# Сколько выгрузок может готовиться одновременно
+MAX_CONCURRENT_EXPORTS = 2
+
+EXPORT_FORMATS = {
+    # Формат: (расширение файла, разделитель, строки заголовка)
+    "csv": ("csv", ",", ()),
+    # Заголовки, которые Anki понимает при импорте текстового файла
+    "anki": ("txt", "\t", ("#separator:tab", "#html:false", "#columns:Front\tBack")),
+}
+
+_export_slots = asyncio.Semaphore(MAX_CONCURRENT_EXPORTS)
+_export_tasks: set[asyncio.Task] = set()
+
+
+# Генератор слов темы, читающий строки из базы пачками.
+# Каждая пачка — отдельный запрос по индексу (topic_id, word), продолжающий с последней строки
+# предыдущей, поэтому соединение из пула не занято, пока пачка пишется в файл.
+async def iter_topic_words(topic_id: int) -> AsyncIterator[list]:
+    rows = await db.fetchall("""SELECT word, translation, rowid FROM user_dictionary
+                                WHERE topic_id = ?
+                                ORDER BY word, rowid
+                                LIMIT ?""", (topic_id, EXPORT_BATCH_SIZE))
+    while rows:
+        yield [(word, translation) for word, translation, _ in rows]
+        if len(rows) < EXPORT_BATCH_SIZE:
+            break
+        word, _, rowid = rows[-1]
+        rows = await db.fetchall("""SELECT word, translation, rowid FROM user_dictionary
+                                    WHERE topic_id = ? AND (word, rowid) > (?, ?)
+                                    ORDER BY word, rowid
+                                    LIMIT ?""", (topic_id, word, rowid, EXPORT_BATCH_SIZE))
+
+
+def export_filename(topic_name: str, export_format: str) -> str:
+    extension = EXPORT_FORMATS[export_format][0]
+    safe_name = re.sub(r"[^\w\- ]+", "", topic_name).strip() or "topic"
+    return f"{safe_name[:50]}.{extension}"
+
+
+# Функция для выгрузки темы в файл и отправки его пользователю
+async def export_topic(bot: Bot, chat_id: int, topic_id: int, topic_name: str, export_format: str) -> None:
+    _, delimiter, header = EXPORT_FORMATS[export_format]
+    # Файл отправляется после ответов пользователям в диалоге
+    send_priority.set(BULK)
+    async with _export_slots:
+        fd, path = tempfile.mkstemp(suffix=".export")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as file:
+                for line in header:
+                    file.write(line + "\n")
+                writer = csv.writer(file, delimiter=delimiter)
+                async for rows in iter_topic_words(topic_id):
+                    await asyncio.to_thread(writer.writerows, rows)
+
+            await bot.send_document(chat_id, FSInputFile(path, filename=export_filename(topic_name, export_format)),
+                                    caption=f'Слова темы "{topic_name}"')
+        except sqlite3.Error as e:
+            logging.error(f"Database error: {e}")
+            await bot.send_message(chat_id, "Произошла ошибка при выгрузке темы.")
+        except TelegramAPIError as e:
+            logging.error(f"Failed to send export of topic {topic_id}: {e}")
+        finally:
+            os.remove(path)
+
+
+# Запуск выгрузки в фоне, чтобы не задерживать обработку обновлений
+def start_export(bot: Bot, chat_id: int, topic_id: int, topic_name: str, export_format: str) -> None:
+    task = asyncio.create_task(export_topic(bot, chat_id, topic_id, topic_name, export_format))
+    _export_tasks.add(task)
+    task.add_done_callback(_export_tasks.discard)
+
+
+async def stop_exports() -> None:
+    for task in list(_export_tasks):
+        task.cancel()
+    await asyncio.gather(*_export_tasks, return_exceptions=True)
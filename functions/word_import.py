@@ -0,0 +1,87 @@
+import csv
+import io
+import re
+from itertools import islice
+from typing import IO, Iterable, Iterator, NamedTuple, Optional
+
+from database import db
+from shared import is_command
+
+# Максимальное число слов за один импорт
+MAX_IMPORT_WORDS = 5000
+# Максимальная длина слова или перевода
+MAX_WORD_LENGTH = 200
+# Сколько строк передавать в executemany за раз
+IMPORT_CHUNK_SIZE = 500
+
+# Названия столбцов, если в файле есть строка заголовка
+HEADER_NAMES = {"word", "words", "слово", "слова", "front"}
+
+# Разделители между словом и переводом в строке вставленного списка
+LINE_SEPARATOR = re.compile(r"\t|\s+[-–—]\s+|\s*;\s*|\s*=\s*")
+
+
+class ImportResult(NamedTuple):
+    added: int
+    skipped: int
+
+
+def _clean_pair(word: str, translation: str):
+    word, translation = word.strip(), translation.strip()
+    if not word or not translation:
+        return None
+    if len(word) > MAX_WORD_LENGTH or len(translation) > MAX_WORD_LENGTH:
+        return None
+    if is_command(word) or is_command(translation):
+        return None
+    return word, translation
+
+
+# Функция для разбора вставленного списка: по строке «слово - перевод» на слово
+def parse_lines(lines: Iterable[str]) -> Iterator[tuple[str, str]]:
+    for line in lines:
+        parts = LINE_SEPARATOR.split(line.strip(), maxsplit=1)
+        if len(parts) == 2:
+            pair = _clean_pair(*parts)
+            if pair:
+                yield pair
+
+
+# Функция для построчного разбора CSV/TSV файла с двумя столбцами
+def parse_csv(stream: IO[bytes]) -> Iterator[tuple[str, str]]:
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    first_line = text.readline()
+    delimiter = "\t" if "\t" in first_line else ";" if ";" in first_line else ","
+    text.seek(0)
+    for number, row in enumerate(csv.reader(text, delimiter=delimiter)):
+        if number == 0 and row and row[0].strip().lower() in HEADER_NAMES:
+            continue
+        if len(row) >= 2:
+            pair = _clean_pair(row[0], row[1])
+            if pair:
+                yield pair
+
+
+# Функция для добавления слов в тему одной транзакцией; None, если темы уже нет.
+# Слова, которые уже есть в теме, пропускаются; счётчики слов обновляют триггеры.
+async def import_words(user_id: int, topic_id: int, pairs: Iterable[tuple[str, str]]) -> Optional[ImportResult]:
+    pairs = islice(pairs, MAX_IMPORT_WORDS)
+    total = 0
+    async with db.transaction() as conn:
+        async with conn.execute("SELECT word_count FROM topics WHERE id = ?", (topic_id,)) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            # Тему удалили, пока пользователь готовил список
+            return None
+        before = row[0]
+        while True:
+            chunk = [(user_id, topic_id, word, translation) for word, translation in islice(pairs, IMPORT_CHUNK_SIZE)]
+            if not chunk:
+                break
+            total += len(chunk)
+            await conn.executemany("""INSERT INTO user_dictionary (user_id, topic_id, word, translation)
+                                      VALUES (?, ?, ?, ?)
+                                      ON CONFLICT DO NOTHING""", chunk)
+        async with conn.execute("SELECT word_count FROM topics WHERE id = ?", (topic_id,)) as cursor:
+            added = (await cursor.fetchone())[0] - before
+    return ImportResult(added, total - added)
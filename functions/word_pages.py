@@ -0,0 +1,113 @@
+from typing import NamedTuple, Optional
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from cache import LRUCache, on_topic_changed
+from callbacks import NS, pack
+from database import db
+
+WORDS_PER_PAGE = 15
+# Для скольких тем держать в памяти готовые страницы
+MAX_CACHED_TOPICS = 1000
+
+
+class WordPage(NamedTuple):
+    text: str
+    reply_markup: InlineKeyboardMarkup
+
+
+# Функция для формирования страницы списка слов
+def render_word_page(words: list, page: int, has_next: bool, topic_id: int) -> WordPage:
+    start_index = page * WORDS_PER_PAGE
+    words_text = "\n".join(
+        f"{i + 1 + start_index}. {word} - {translation}" for i, (word, translation) in enumerate(words))
+
+    # Создаем клавиатуру для навигации
+    nav_kb = []
+    if page > 0:
+        nav_kb.append(InlineKeyboardButton(text="Назад", callback_data=pack(NS.WORD_PAGE, page - 1, topic_id)))
+    if has_next:
+        nav_kb.append(InlineKeyboardButton(text="Вперёд", callback_data=pack(NS.WORD_PAGE, page + 1, topic_id)))
+
+    # Создаем клавиатуру для удаления слова
+    delete_kb = [[InlineKeyboardButton(text="Удалить слово", callback_data=pack(NS.DELETE_WORD, topic_id))]]
+    go_back = [[InlineKeyboardButton(text="Назад", callback_data=pack(NS.GO_BACK, topic_id))]]
+    # Объединяем навигационную клавиатуру с клавиатурой для удаления
+    full_kb = InlineKeyboardMarkup(inline_keyboard=[nav_kb, *delete_kb, *go_back])
+
+    return WordPage(f"Слова:\n{words_text}", full_kb)
+
+
+class TopicPages:
+    """Постраничный просмотр слов темы.
+
+    Страницы читаются по индексу (topic_id, word): для каждой следующей
+    страницы запоминается последняя строка предыдущей, и запрос
+    продолжает с неё, не пропуская строки через OFFSET. Готовые страницы
+    кэшируются до изменения слов темы.
+    """
+
+    def __init__(self, topic_id: int, word_count: int) -> None:
+        self.topic_id = topic_id
+        self.word_count = word_count
+        # _cursors[n] — (word, rowid) последней строки страницы n - 1
+        self._cursors: list[Optional[tuple[str, int]]] = [None]
+        self._pages: dict[int, WordPage] = {}
+
+    @property
+    def last_page(self) -> int:
+        return max(0, (self.word_count - 1) // WORDS_PER_PAGE)
+
+    async def _fetch(self, page: int) -> list:
+        if page < len(self._cursors) and self._cursors[page] is not None:
+            word, rowid = self._cursors[page]
+            return await db.fetchall("""
+                SELECT word, translation, rowid FROM user_dictionary
+                WHERE topic_id = ? AND (word, rowid) > (?, ?)
+                ORDER BY word, rowid
+                LIMIT ?
+            """, (self.topic_id, word, rowid, WORDS_PER_PAGE + 1))
+        # Первая страница или переход на страницу, до которой ещё не листали
+        return await db.fetchall("""
+            SELECT word, translation, rowid FROM user_dictionary
+            WHERE topic_id = ?
+            ORDER BY word, rowid
+            LIMIT ? OFFSET ?
+        """, (self.topic_id, WORDS_PER_PAGE + 1, page * WORDS_PER_PAGE))
+
+    async def page(self, page: int) -> WordPage:
+        page = min(max(page, 0), self.last_page)
+        cached = self._pages.get(page)
+        if cached is not None:
+            return cached
+
+        rows = await self._fetch(page)
+        has_next = len(rows) > WORDS_PER_PAGE
+        rows = rows[:WORDS_PER_PAGE]
+        if has_next and page + 1 == len(self._cursors):
+            self._cursors.append((rows[-1][0], rows[-1][2]))
+
+        rendered = render_word_page([(word, translation) for word, translation, _ in rows],
+                                    page, has_next, self.topic_id)
+        self._pages[page] = rendered
+        return rendered
+
+
+_topic_pages = LRUCache(MAX_CACHED_TOPICS)
+
+
+@on_topic_changed
+def _drop_topic_pages(topic_id: int) -> None:
+    _topic_pages.pop(topic_id)
+
+
+# Функция для получения постраничного списка слов темы; None, если темы нет
+async def get_topic_pages(topic_id: int) -> Optional[TopicPages]:
+    pages = _topic_pages.get(topic_id)
+    if pages is None:
+        row = await db.fetchone("SELECT word_count FROM topics WHERE id = ?", (topic_id,))
+        if row is None:
+            return None
+        pages = TopicPages(topic_id, row[0] or 0)
+        _topic_pages.set(topic_id, pages)
+    return pages
@@ -1,24 +1,31 @@
 import logging
-from aiogram import Bot, Dispatcher, types, F
+from aiogram import Dispatcher, types, F
 from aiogram.filters import Command
 import asyncio
 import sys
 
 from aiogram.fsm.context import FSMContext
 import datetime
+from callbacks import callbacks_router
 from functions.add_topic import add_topic_prompt, add_topic_router
 from functions.add_words import add_words_router
 from functions.grammar import grammar_router
 from functions.learning import learning_router
 from functions.profile import profile_router
+from functions.reminders import reminders_router, run_reminders
 from functions.repeat_words import repeat_words_router
 from functions.start_command import process_start_command, start_router
-from shared import Form, TranslationStates, TOKEN
-from aiogram.client.session.aiohttp import AiohttpSession
+from database import db
+from fsm_storage import SQLiteStorage
+from metrics import setup_metrics
+from outbound import drain_background_sends, send_scheduler
+from migrations import migrate
+from shared import Form, TranslationStates, bot, BOT_MODE, DB_FILE
+from webhook import start_webhook
 
-session = AiohttpSession(proxy="http://proxy.server:3128")
-bot = Bot(token=TOKEN, session=session)
-dp = Dispatcher()
+# Состояния FSM хранятся в базе и переживают перезапуск бота.
+# Dispatcher сам вызывает storage.close() при остановке, и она дописывает изменения.
+dp = Dispatcher(storage=SQLiteStorage())
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, stream=sys.stdout)
@@ -36,7 +43,11 @@ COMMANDS = [
     "Отменить действие",
     "Прекратить"
 ]
+# Все нажатия inline-кнопок проходят через один обработчик, который выбирает
+# обработчик по пространству имён callback_data (см. callbacks.py)
+dp.include_router(callbacks_router)
 dp.include_router(profile_router)
+dp.include_router(reminders_router)
 dp.include_router(learning_router)
 dp.include_router(add_topic_router)
 dp.include_router(add_words_router)
@@ -44,11 +55,22 @@ dp.include_router(repeat_words_router)
 dp.include_router(grammar_router)
 dp.include_router(start_router)
 
+# Пул соединений с базой данных открывается при старте бота. Закрывается он
+# в main() уже после shutdown-хуков роутеров, которые ещё пишут в базу.
+dp.startup.register(db.open)
+
+# Отправка сообщений в пределах лимитов Telegram с повтором после 429
+bot.session.middleware(send_scheduler)
+dp.shutdown.register(drain_background_sends)
+
+# Метрики обработчиков, запросов к базе и вызовов Bot API (GET /metrics).
+# Middleware сессии регистрируется после планировщика, поэтому время ожидания лимита не входит в задержку вызова.
+setup_metrics(dp, bot)
+
 # Функция для добавления или обновления пользователя в базе данных
-async def upsert_user(user_id: int, username_tg: str, full_name: str, balance: int = 0, elite_status: str = 'No',
-                learned_words_count: int = 0) -> None:
+async def upsert_user(user_id: int, username_tg: str, full_name: str) -> bool:
     from functions.start_command import upsert_user
-    await upsert_user(user_id, username_tg, full_name, balance, elite_status, learned_words_count)
+    return await upsert_user(user_id, username_tg, full_name)
 
 
 # Функция для добавления темы в базу данных (с привязкой к пользователю)
@@ -75,8 +97,21 @@ async def is_topic_exists(author_id: int, content: str) -> bool:
 
 # Запуск бота
 async def main() -> None:
-    logging.info("Bot is starting...")
-    await dp.start_polling(bot)
+    logging.info(f"Bot is starting in {BOT_MODE} mode...")
+    migrate(DB_FILE)
+    # Напоминания о повторении рассылаются в фоне всё время работы бота
+    reminders = asyncio.create_task(run_reminders(bot))
+    try:
+        if BOT_MODE == "webhook":
+            await start_webhook(dp, bot)
+        else:
+            # getUpdates не работает, пока установлен вебхук
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        reminders.cancel()
+        await asyncio.gather(reminders, return_exceptions=True)
+        await db.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
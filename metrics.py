@@ -0,0 +1,232 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import TelegramObject, Update
+from aiohttp import web
+
+from shared import METRICS_HOST, METRICS_PORT
+
+# Границы корзин гистограмм в секундах
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Метрика с метками в текстовом формате Prometheus.
+
+    Значения могут меняться из потоков соединений aiosqlite, поэтому
+    изменения защищены блокировкой.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items: list) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in items]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            sample = self._values.get(labels)
+            if sample is None:
+                # Счётчики по корзинам (последняя — +Inf) и сумма значений
+                sample = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            sample[0][bisect_left(self.buckets, value)] += 1
+            sample[1] += value
+
+    def _render_samples(self, items: list) -> list[str]:
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+REGISTRY: list[Metric] = []
+
+UPDATES = Counter("bot_updates_total", "Updates received, by update type.", ("type",))
+UPDATE_ERRORS = Counter("bot_update_errors_total", "Updates that raised an exception, by update type.", ("type",))
+UPDATES_IN_FLIGHT = Gauge("bot_updates_in_flight", "Updates being processed right now.")
+UPDATE_DURATION = Histogram("bot_update_duration_seconds", "Time to process an update, by update type.", ("type",))
+HANDLER_DURATION = Histogram("bot_handler_duration_seconds", "Handler latency.", ("router", "handler"))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Handler exceptions.", ("router", "handler"))
+DB_QUERIES = Counter("bot_db_queries_total", "SQL statements executed by SQLite, including trigger bodies.",
+                     ("operation",))
+DB_QUERY_DURATION = Histogram("bot_db_query_duration_seconds", "Database call latency, including pool wait.",
+                              ("operation",), buckets=DB_LATENCY_BUCKETS)
+TELEGRAM_REQUEST_DURATION = Histogram("bot_telegram_request_duration_seconds", "Bot API call latency.", ("method",))
+TELEGRAM_REQUEST_ERRORS = Counter("bot_telegram_request_errors_total", "Failed Bot API calls.", ("method",))
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Тип запроса по первому слову: SELECT, INSERT, UPDATE, ...
+def sql_operation(sql: str) -> str:
+    sql = sql.lstrip()
+    if sql.startswith("--"):
+        return "TRIGGER"  # SQLite сообщает о выражениях внутри триггеров комментарием
+    return sql.split(None, 1)[0].upper() if sql else "OTHER"
+
+
+# Функция обратного вызова для connection.set_trace_callback: считает все выполненные выражения
+def trace_sql(statement: str) -> None:
+    DB_QUERIES.inc(sql_operation(statement))
+
+
+# Замер длительности обращения к базе
+@contextmanager
+def timed_query(sql: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        DB_QUERY_DURATION.observe(time.perf_counter() - started, sql_operation(sql))
+
+
+# Внешний middleware диспетчера: считает все обновления, в том числе необработанные
+async def update_metrics_middleware(handler: Callable[[TelegramObject, dict], Awaitable[Any]],
+                                    event: Update, data: dict) -> Any:
+    update_type = event.event_type
+    UPDATES.inc(update_type)
+    UPDATES_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    try:
+        return await handler(event, data)
+    except Exception:
+        UPDATE_ERRORS.inc(update_type)
+        raise
+    finally:
+        UPDATE_DURATION.observe(time.perf_counter() - started, update_type)
+        UPDATES_IN_FLIGHT.dec()
+
+
+# Внутренний middleware: вызывается, когда обработчик уже выбран, поэтому знает его имя.
+# Для нажатий кнопок берётся обработчик, выбранный по callback_data.
+async def handler_metrics_middleware(handler: Callable[[TelegramObject, dict], Awaitable[Any]],
+                                     event: TelegramObject, data: dict) -> Any:
+    callback = data.get("callback_handler", data["handler"]).callback
+    labels = (callback.__module__.rsplit(".", 1)[-1], callback.__name__)
+    started = time.perf_counter()
+    try:
+        return await handler(event, data)
+    except Exception:
+        HANDLER_ERRORS.inc(*labels)
+        raise
+    finally:
+        HANDLER_DURATION.observe(time.perf_counter() - started, *labels)
+
+
+# Middleware HTTP-сессии бота: время каждого вызова Bot API по методам
+async def telegram_request_metrics(make_request, bot: Bot, method) -> Any:
+    name = method.__api_method__
+    started = time.perf_counter()
+    try:
+        return await make_request(bot, method)
+    except Exception:
+        TELEGRAM_REQUEST_ERRORS.inc(name)
+        raise
+    finally:
+        TELEGRAM_REQUEST_DURATION.observe(time.perf_counter() - started, name)
+
+
+def setup_metrics(dp: Dispatcher, bot: Bot) -> None:
+    dp.update.outer_middleware(update_metrics_middleware)
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(handler_metrics_middleware)
+    bot.session.middleware(telegram_request_metrics)
+    dp.startup.register(start_metrics_server)
+    dp.shutdown.register(stop_metrics_server)
+
+
+_runner: Optional[web.AppRunner] = None
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+# Запуск HTTP-сервера с метриками; пустой METRICS_PORT отключает его
+async def start_metrics_server() -> None:
+    global _runner
+    if not METRICS_PORT or _runner is not None:
+        return
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    _runner = web.AppRunner(app, access_log=None)
+    await _runner.setup()
+    await web.TCPSite(_runner, host=METRICS_HOST, port=int(METRICS_PORT)).start()
+    logging.info(f"Metrics available at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+
+async def stop_metrics_server() -> None:
+    global _runner
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
@@ -1,6 +1,16 @@
 import sqlite3
+import time
 from sqlite3 import Connection
 
+# Пересчёт счётчиков пользователей; меняет только строки, где счётчик разошёлся с данными
+RECONCILE_COUNTERS_SQL = """
+    UPDATE users SET
+        learned_words_count = (SELECT COUNT(*) FROM user_dictionary d WHERE d.user_id = users.user_id),
+        topics_count = (SELECT COUNT(*) FROM topics t WHERE t.author_id = users.user_id)
+    WHERE learned_words_count IS NOT (SELECT COUNT(*) FROM user_dictionary d WHERE d.user_id = users.user_id)
+       OR topics_count IS NOT (SELECT COUNT(*) FROM topics t WHERE t.author_id = users.user_id)
+"""
+
 def upgrade_to_v1(conn: Connection) -> None:
     """Обновление базы данных до версии 1"""
     cursor = conn.cursor()
@@ -139,19 +149,318 @@ def upgrade_to_v1(conn: Connection) -> None:
             )
         """)
 
-    conn.commit()
+
+def upgrade_to_v2(conn: Connection) -> None:
+    """Обновление базы данных до версии 2: веса ошибок в неправильных глаголах"""
+    cursor = conn.cursor()
+
+    cursor.execute(""" 
+        CREATE TABLE IF NOT EXISTS verb_mistakes (
+            user_id INTEGER NOT NULL,
+            verb TEXT NOT NULL,
+            weight INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, verb)
+        ) WITHOUT ROWID
+    """)
+
+
+def upgrade_to_v3(conn: Connection) -> None:
+    """Обновление базы данных до версии 3: состояние интервального повторения слов"""
+    cursor = conn.cursor()
+
+    cursor.execute(""" 
+        CREATE TABLE IF NOT EXISTS word_reviews (
+            user_id INTEGER NOT NULL,
+            topic_id INTEGER NOT NULL,
+            word TEXT NOT NULL,
+            due_at REAL NOT NULL DEFAULT 0,
+            interval_days REAL NOT NULL DEFAULT 0,
+            ease REAL NOT NULL DEFAULT 2.5,
+            repetitions INTEGER NOT NULL DEFAULT 0,
+            lapses INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, topic_id, word)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_word_reviews_due ON word_reviews (user_id, topic_id, due_at);")
+
+    # Новые слова сразу попадают в очередь повторения, удалённые — убираются из неё
+    cursor.execute(""" 
+        CREATE TRIGGER IF NOT EXISTS trg_user_dictionary_review_insert
+        AFTER INSERT ON user_dictionary
+        BEGIN
+            INSERT OR IGNORE INTO word_reviews (user_id, topic_id, word)
+            VALUES (NEW.user_id, NEW.topic_id, NEW.word);
+        END
+    """)
+    cursor.execute(""" 
+        CREATE TRIGGER IF NOT EXISTS trg_user_dictionary_review_delete
+        AFTER DELETE ON user_dictionary
+        BEGIN
+            DELETE FROM word_reviews
+            WHERE user_id = OLD.user_id AND topic_id = OLD.topic_id AND word = OLD.word;
+        END
+    """)
+
+    # Слова, добавленные до появления таблицы
+    cursor.execute(""" 
+        INSERT OR IGNORE INTO word_reviews (user_id, topic_id, word)
+        SELECT user_id, topic_id, word FROM user_dictionary
+    """)
+
+
+def upgrade_to_v4(conn: Connection) -> None:
+    """Обновление базы данных до версии 4: счётчики слов и тем поддерживаются триггерами"""
+    cursor = conn.cursor()
+
+    cursor.execute("PRAGMA table_info(users);")
+    columns = [column[1] for column in cursor.fetchall()]
+    if 'topics_count' not in columns:
+        cursor.execute("ALTER TABLE users ADD COLUMN topics_count INTEGER DEFAULT 0;")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_topics_author ON topics (author_id);")
+
+    # Изменяем счётчики в той же транзакции, что и вставку или удаление строки
+    cursor.execute(""" 
+        CREATE TRIGGER IF NOT EXISTS trg_user_dictionary_count_insert
+        AFTER INSERT ON user_dictionary
+        BEGIN
+            UPDATE users SET learned_words_count = COALESCE(learned_words_count, 0) + 1
+            WHERE user_id = NEW.user_id;
+        END
+    """)
+    cursor.execute(""" 
+        CREATE TRIGGER IF NOT EXISTS trg_user_dictionary_count_delete
+        AFTER DELETE ON user_dictionary
+        BEGIN
+            UPDATE users SET learned_words_count = MAX(COALESCE(learned_words_count, 0) - 1, 0)
+            WHERE user_id = OLD.user_id;
+        END
+    """)
+    cursor.execute(""" 
+        CREATE TRIGGER IF NOT EXISTS trg_topics_count_insert
+        AFTER INSERT ON topics
+        BEGIN
+            UPDATE users SET topics_count = COALESCE(topics_count, 0) + 1
+            WHERE user_id = NEW.author_id;
+        END
+    """)
+    cursor.execute(""" 
+        CREATE TRIGGER IF NOT EXISTS trg_topics_count_delete
+        AFTER DELETE ON topics
+        BEGIN
+            UPDATE users SET topics_count = MAX(COALESCE(topics_count, 0) - 1, 0)
+            WHERE user_id = OLD.author_id;
+        END
+    """)
+
+    # Пересчитываем счётчики один раз, дальше их поддерживают триггеры
+    cursor.execute(RECONCILE_COUNTERS_SQL)
+
+
+def upgrade_to_v5(conn: Connection) -> None:
+    """Обновление базы данных до версии 5: индекс для таблицы лидеров"""
+    cursor = conn.cursor()
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_learned_words ON users (learned_words_count DESC);")
+
+
+def upgrade_to_v6(conn: Connection) -> None:
+    """Обновление базы данных до версии 6: число слов в теме и индекс для постраничного просмотра"""
+    cursor = conn.cursor()
+
+    cursor.execute("PRAGMA table_info(topics);")
+    columns = [column[1] for column in cursor.fetchall()]
+    if 'word_count' not in columns:
+        cursor.execute("ALTER TABLE topics ADD COLUMN word_count INTEGER NOT NULL DEFAULT 0;")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_dictionary_topic_word ON user_dictionary (topic_id, word);")
+
+    cursor.execute(""" 
+        CREATE TRIGGER IF NOT EXISTS trg_user_dictionary_topic_count_insert
+        AFTER INSERT ON user_dictionary
+        BEGIN
+            UPDATE topics SET word_count = word_count + 1 WHERE id = NEW.topic_id;
+        END
+    """)
+    cursor.execute(""" 
+        CREATE TRIGGER IF NOT EXISTS trg_user_dictionary_topic_count_delete
+        AFTER DELETE ON user_dictionary
+        BEGIN
+            UPDATE topics SET word_count = MAX(word_count - 1, 0) WHERE id = OLD.topic_id;
+        END
+    """)
+
+    cursor.execute(""" 
+        UPDATE topics SET word_count = (SELECT COUNT(*) FROM user_dictionary d WHERE d.topic_id = topics.id)
+    """)
+
+
+def upgrade_to_v7(conn: Connection) -> None:
+    """Обновление базы данных до версии 7: полнотекстовый индекс названий тем"""
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='topics_fts';")
+    table_exists = cursor.fetchone()
+
+    if not table_exists:
+        try:
+            # Триграммы позволяют искать по любой подстроке названия, как LIKE '%...%'
+            cursor.execute(""" 
+                CREATE VIRTUAL TABLE topics_fts USING fts5(
+                    content, content='topics', content_rowid='id', tokenize='trigram'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            # Старые сборки SQLite без FTS5 или токенизатора trigram: поиск останется на LIKE
+            print(f"Full-text search is unavailable: {e}")
+            return
+        cursor.execute("INSERT INTO topics_fts (topics_fts) VALUES ('rebuild');")
+
+    cursor.execute(""" 
+        CREATE TRIGGER IF NOT EXISTS trg_topics_fts_insert
+        AFTER INSERT ON topics
+        BEGIN
+            INSERT INTO topics_fts (rowid, content) VALUES (NEW.id, NEW.content);
+        END
+    """)
+    cursor.execute(""" 
+        CREATE TRIGGER IF NOT EXISTS trg_topics_fts_delete
+        AFTER DELETE ON topics
+        BEGIN
+            INSERT INTO topics_fts (topics_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+        END
+    """)
+    cursor.execute(""" 
+        CREATE TRIGGER IF NOT EXISTS trg_topics_fts_update
+        AFTER UPDATE OF content ON topics
+        BEGIN
+            INSERT INTO topics_fts (topics_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+            INSERT INTO topics_fts (rowid, content) VALUES (NEW.id, NEW.content);
+        END
+    """)
+
+
+def upgrade_to_v8(conn: Connection) -> None:
+    """Обновление базы данных до версии 8: индексы под запросы обработчиков"""
+    cursor = conn.cursor()
+
+    # Проверка названия темы у автора; индекс по author_id больше не нужен
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_topics_author_content ON topics (author_id, content);")
+    cursor.execute("DROP INDEX IF EXISTS idx_topics_author;")
+    # Выбор темы по названию из инлайн-результата
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_topics_content ON topics (content);")
+    # Слова пользователя в теме (повторение, экспорт) без обращения к таблице
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_dictionary_topic_user
+        ON user_dictionary (topic_id, user_id, word, translation);
+    """)
+    # Поиск пригласившего по реферальному коду
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_referral_code ON users (referral_code);")
+
+    cursor.execute("ANALYZE;")
+
+
+def upgrade_to_v9(conn: Connection) -> None:
+    """Обновление базы данных до версии 9: хранилище состояний FSM"""
+    cursor = conn.cursor()
+
+    cursor.execute(""" 
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT
+        ) WITHOUT ROWID
+    """)
+
+
+def upgrade_to_v10(conn: Connection) -> None:
+    """Обновление базы данных до версии 10: напоминания о повторении"""
+    cursor = conn.cursor()
+
+    # Настройки напоминаний; пользователи без строки получают их с настройками по умолчанию
+    cursor.execute(""" 
+        CREATE TABLE IF NOT EXISTS reminder_settings (
+            user_id INTEGER PRIMARY KEY,
+            enabled INTEGER NOT NULL DEFAULT 1,
+            quiet_start INTEGER NOT NULL DEFAULT 22,
+            quiet_end INTEGER NOT NULL DEFAULT 9,
+            last_sent_at REAL NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    # Текущий проход рассылки: last_user_id — последний обработанный пользователь, NULL — проход завершён
+    cursor.execute(""" 
+        CREATE TABLE IF NOT EXISTS reminder_runs (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            started_at REAL NOT NULL,
+            last_user_id INTEGER
+        )
+    """)
+
+
+def upgrade_to_v11(conn: Connection) -> None:
+    """Обновление базы данных до версии 11: второй инфинитив неправильных глаголов"""
+    cursor = conn.cursor()
+
+    # В новой базе upgrade_to_v1 создавал таблицу без этого столбца
+    cursor.execute("PRAGMA table_info(irregular_verbs);")
+    columns = [column[1] for column in cursor.fetchall()]
+    if 'v1_second' not in columns:
+        cursor.execute("ALTER TABLE irregular_verbs ADD COLUMN v1_second TEXT DEFAULT NULL;")
+
+
+# Миграции по порядку: номер версии базы — позиция в списке, начиная с 1
+MIGRATIONS = [
+    upgrade_to_v1,
+    upgrade_to_v2,
+    upgrade_to_v3,
+    upgrade_to_v4,
+    upgrade_to_v5,
+    upgrade_to_v6,
+    upgrade_to_v7,
+    upgrade_to_v8,
+    upgrade_to_v9,
+    upgrade_to_v10,
+    upgrade_to_v11,
+]
+
+
+def apply_migrations(conn: Connection) -> int:
+    """Применяет недостающие миграции к открытому соединению и возвращает версию базы.
+
+    Текущая версия хранится в PRAGMA user_version. Каждая недостающая
+    миграция выполняется в своей транзакции вместе с повышением версии,
+    поэтому при ошибке база остаётся на предыдущей версии.
+    """
+    version = conn.execute("PRAGMA user_version;").fetchone()[0]
+    for number, upgrade in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            upgrade(conn)
+            conn.execute(f"PRAGMA user_version = {number};")
+            conn.execute("COMMIT;")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK;")
+            raise
+        print(f"Migration {number} ({upgrade.__name__}) applied in {(time.perf_counter() - started) * 1000:.1f} ms")
+        version = number
+    return version
 
 
 def migrate(db_file: str) -> None:
-    """Функция для применения миграций"""
-    conn = sqlite3.connect(db_file)
+    """Функция для применения миграций к файлу базы."""
+    conn = sqlite3.connect(db_file, isolation_level=None)
     try:
-        upgrade_to_v1(conn)  # Применяем миграцию версии 1
-        print("Migration applied.")
+        version = apply_migrations(conn)
+        print(f"Database schema is at version {version}.")
     except sqlite3.Error as e:
         print(f"Database error: {e}")
+        raise
     finally:
         conn.close()
 
+
 if __name__ == "__main__":
     migrate('database.db')
@@ -0,0 +1,195 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from cache import LRUCache
+from metrics import Counter, Histogram
+
+# Ограничения Telegram: около 30 сообщений в секунду на бота,
+# одно сообщение в секунду в личный чат и 20 в минуту в группу
+GLOBAL_RATE = 30
+GLOBAL_BURST = 30
+PRIVATE_CHAT_RATE = 1
+GROUP_CHAT_RATE = 20 / 60
+# Сколько сообщений подряд можно отправить в чат без ожидания (например, "Правильно!" и следующий вопрос)
+CHAT_BURST = 3
+# Для скольких чатов помнить состояние лимита
+MAX_TRACKED_CHATS = 50000
+
+# Попытки отправки при 429 и ошибках сети, случайная добавка к паузе между ними в секундах
+MAX_SEND_ATTEMPTS = 5
+RETRY_JITTER = 1.0
+
+# Методы, на которые действуют лимиты сообщений
+RATE_LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+# Методы, которые создают новое сообщение или объект. Если запрос дошёл до Telegram,
+# а потерялся только ответ, повтор продублирует результат, поэтому их повторяем только после 429
+NON_IDEMPOTENT_PREFIXES = ("send", "copy", "forward", "create")
+IDEMPOTENT_SEND_METHODS = frozenset({"sendChatAction"})
+# Повторы getUpdates выполняет сам Dispatcher
+NO_RETRY_METHODS = frozenset({"getUpdates"})
+
+# Приоритет отправки: ответы пользователю раньше массовых рассылок
+INTERACTIVE = 0
+BULK = 1
+send_priority: ContextVar[int] = ContextVar("send_priority", default=INTERACTIVE)
+
+SEND_WAIT = Histogram("bot_send_wait_seconds", "Time a Bot API call waited for the rate limiter.", ("priority",))
+SEND_RETRIES = Counter("bot_send_retries_total", "Bot API calls retried after 429 or network errors.", ("reason",))
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity про запас.
+
+    reserve() забирает токен сразу, даже если его ещё нет, и возвращает,
+    сколько нужно подождать. Поэтому вызовы одного чата выполняются
+    в том порядке, в котором пришли.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def reserve(self, now: float) -> float:
+        wait = self.delay(now)
+        self.tokens -= 1
+        return wait
+
+    def block(self, seconds: float) -> None:
+        # После 429 Telegram сам говорит, сколько ждать; накопленный запас сгорает
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 0)
+
+
+class SendScheduler:
+    """Middleware HTTP-сессии бота, которое держит отправку сообщений в лимитах Telegram.
+
+    Каждый вызов ждёт токен своего чата, а затем общий токен бота. Общие
+    токены раздаются по приоритету: ответы в диалоге обгоняют рассылки.
+    На 429 чат ставится на паузу на retry_after секунд и вызов повторяется.
+    После ошибок сети и 5xx повторяются только идемпотентные вызовы.
+    """
+
+    def __init__(self) -> None:
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._chats = LRUCache(MAX_TRACKED_CHATS)
+        # Очередь ожидающих общего токена: (приоритет, номер, future)
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._release_task: Optional[asyncio.Task] = None
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(GROUP_CHAT_RATE if is_group else PRIVATE_CHAT_RATE, CHAT_BURST)
+            self._chats.set(chat_id, bucket)
+        return bucket
+
+    async def _acquire_global(self, priority: int) -> None:
+        if not self._waiters and self._global.delay(time.monotonic()) == 0:
+            self._global.tokens -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        if self._release_task is None or self._release_task.done():
+            self._release_task = asyncio.create_task(self._release_tokens())
+        await waiter
+
+    async def _release_tokens(self) -> None:
+        while self._waiters:
+            wait = self._global.delay(time.monotonic())
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                self._global.tokens -= 1
+                waiter.set_result(None)
+
+    async def acquire(self, chat_id: Any, priority: int) -> None:
+        started = time.monotonic()
+        if chat_id is not None:
+            wait = self._chat_bucket(chat_id).reserve(started)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        await self._acquire_global(priority)
+        SEND_WAIT.observe(time.monotonic() - started, "bulk" if priority == BULK else "interactive")
+
+    async def __call__(self, make_request, bot: Bot, method) -> Any:
+        name = method.__api_method__
+        if name in NO_RETRY_METHODS:
+            return await make_request(bot, method)
+        rate_limited = name.startswith(RATE_LIMITED_PREFIXES)
+        idempotent = not name.startswith(NON_IDEMPOTENT_PREFIXES) or name in IDEMPOTENT_SEND_METHODS
+
+        chat_id = getattr(method, "chat_id", None)
+        priority = send_priority.get()
+        for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+            if rate_limited:
+                await self.acquire(chat_id, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if not rate_limited or attempt == MAX_SEND_ATTEMPTS:
+                    raise
+                bucket = self._chat_bucket(chat_id) if chat_id is not None else self._global
+                bucket.block(e.retry_after + random.uniform(0, RETRY_JITTER))
+                SEND_RETRIES.inc("retry_after")
+                logging.warning(f"Flood control on {method.__api_method__} in chat {chat_id}, "
+                                f"retrying in {e.retry_after} s")
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if not idempotent or attempt == MAX_SEND_ATTEMPTS:
+                    raise
+                SEND_RETRIES.inc("network")
+                logging.warning(f"{method.__api_method__} failed ({e}), retry {attempt}")
+                await asyncio.sleep(2 ** (attempt - 1) + random.uniform(0, RETRY_JITTER))
+
+
+send_scheduler = SendScheduler()
+_background_sends: set[asyncio.Task] = set()
+
+
+async def _send(request: Awaitable, priority: int) -> Any:
+    send_priority.set(priority)
+    try:
+        return await request
+    except TelegramAPIError as e:
+        logging.error(f"Background send failed: {e}")
+
+
+# Функция для отправки, которую обработчик не ждёт: например, последнего ответа или рассылки.
+# Порядок таких сообщений относительно остальных в том же чате не гарантируется.
+def send_in_background(request: Awaitable, priority: int = INTERACTIVE) -> asyncio.Task:
+    task = asyncio.create_task(_send(request, priority))
+    _background_sends.add(task)
+    task.add_done_callback(_background_sends.discard)
+    return task
+
+
+# При остановке бота дожидаемся отправки того, что уже поставлено в очередь
+async def drain_background_sends(timeout: float = 10) -> None:
+    if _background_sends:
+        await asyncio.wait(set(_background_sends), timeout=timeout)
@@ -1,18 +1,70 @@
-import logging
-import sqlite3
-from sqlite3 import Connection
+import os
+from typing import Any
 
+import orjson
 from aiogram import Dispatcher, Bot
 from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.state import StatesGroup, State
 
-from token_of_bot import API_TOKEN
+try:
+    from token_of_bot import API_TOKEN
+except ImportError:
+    API_TOKEN = None
 
-TOKEN = API_TOKEN
-DB_FILE = 'database.db'
+# Токен и файл базы можно переопределить переменными окружения (например, для benchmark.py)
+TOKEN = os.getenv("BOT_TOKEN") or API_TOKEN
+DB_FILE = os.getenv("BOT_DB_FILE", 'database.db')
 
-session = AiohttpSession(proxy="http://proxy.server:3128")
-bot = Bot(token=TOKEN, session=session)
+# Настройки HTTP-клиента для Telegram Bot API
+PROXY = os.getenv("BOT_PROXY", "http://proxy.server:3128") or None  # Пустая строка отключает прокси
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")  # Например, адрес локальной заглушки fake_bot_api.py
+HTTP_CONNECTION_LIMIT = 100  # Максимум одновременных соединений
+HTTP_KEEPALIVE_TIMEOUT = 60  # Сколько секунд держать простаивающее соединение открытым
+HTTP_DNS_CACHE_TTL = 3600  # Время жизни кэша DNS в секундах
+HTTP_REQUEST_TIMEOUT = 60  # Таймаут запроса к API в секундах
+
+# Способ получения обновлений: "polling" (по умолчанию) или "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Публичный адрес, на который Telegram шлёт обновления
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+# Адрес HTTP-сервера с метриками в формате Prometheus; пустой METRICS_PORT отключает сервер
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = os.getenv("METRICS_PORT", "9090")
+
+
+def json_dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode()
+
+
+# Функция для создания HTTP-сессии бота, все настройки соединений задаются здесь
+def create_session() -> AiohttpSession:
+    session = AiohttpSession(
+        proxy=PROXY,
+        limit=HTTP_CONNECTION_LIMIT,
+        json_loads=orjson.loads,
+        json_dumps=json_dumps,
+        timeout=HTTP_REQUEST_TIMEOUT,
+    )
+    if TELEGRAM_API_URL:
+        session.api = TelegramAPIServer.from_base(TELEGRAM_API_URL)
+    # При работе через прокси aiogram пересоздаёт параметры коннектора,
+    # поэтому лимит соединений задаём повторно
+    session._connector_init.update(
+        limit=HTTP_CONNECTION_LIMIT,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+    )
+    return session
+
+
+# Единственный экземпляр бота на всё приложение. Обработчики получают его
+# через аргумент `bot` или через `message.bot`, а не создают свой.
+bot = Bot(token=TOKEN, session=create_session())
 dp = Dispatcher()
 
 class DeleteStates(StatesGroup):
@@ -31,29 +83,9 @@ class Form(StatesGroup):
     waiting_for_topic_name = State()
     waiting_for_word = State()
     waiting_for_translation = State()
-
-
-# Функция для создания соединения с базой данных
-def create_connection(db_file: str) -> Connection:
-    try:
-        conn = sqlite3.connect(db_file)
-        logging.info("Connection to database established.")
-        return conn
-    except sqlite3.Error as e:
-        logging.error(f"Database connection error: {e}")
-        raise
+    waiting_for_import = State()
 
 
 # Функция для проверки на наличие команд
 def is_command(text: str) -> bool:
     return text.startswith('/')
-
-# Функция для обновления количества изученных слов
-async def update_learned_words_count(user_id: int) -> int:
-    from functions.profile import update_learned_words_count
-    await update_learned_words_count(user_id)
-
-# Функция для обновления количества созданных тем
-async def update_learned_topics_count(user_id: int) -> None:
-    from functions.profile import update_learned_topics_count
-    await update_learned_topics_count(user_id)
\ No newline at end of file
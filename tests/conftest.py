@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Модули бота читают настройки при импорте: тесты работают с временной базой и без сети
+os.environ.setdefault("BOT_TOKEN", "42:TEST")
+os.environ.setdefault("BOT_DB_FILE", os.path.join(tempfile.mkdtemp(prefix="bot-tests-"), "database.db"))
+os.environ["BOT_PROXY"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,38 @@
+import asyncio
+import sqlite3
+
+from functions import irregular_verbs
+from migrations import MIGRATIONS, apply_migrations
+
+
+class MemoryDatabase:
+    """Подменяет пул соединений: запросы выполняются на одном соединении sqlite3."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    async def fetchall(self, sql, params=()):
+        return self.conn.execute(sql, params).fetchall()
+
+
+def test_fresh_database_migrates_and_loads_verb_index(monkeypatch):
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    assert apply_migrations(conn) == len(MIGRATIONS)
+
+    columns = [column[1] for column in conn.execute("PRAGMA table_info(irregular_verbs);")]
+    assert "v1_second" in columns
+
+    conn.execute("""INSERT INTO irregular_verbs (v1, v2_first, v3_first, first_translation)
+                    VALUES ('go', 'went', 'gone', 'идти')""")
+    monkeypatch.setattr(irregular_verbs, "db", MemoryDatabase(conn))
+    monkeypatch.setattr(irregular_verbs, "VERB_INDEX", irregular_verbs.VERB_INDEX)
+    asyncio.run(irregular_verbs.load_verb_index())
+
+    assert len(irregular_verbs.VERB_INDEX) == 1
+    assert irregular_verbs.VERB_INDEX.card("go") is not None
+
+
+def test_migrations_are_idempotent():
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    apply_migrations(conn)
+    assert apply_migrations(conn) == len(MIGRATIONS)
@@ -0,0 +1,60 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+from database import db
+from functions import add_topic, profile, user_profiles
+from migrations import migrate
+
+USER_ID = 700_000_001
+
+
+class FakeState:
+    async def clear(self) -> None:
+        pass
+
+
+def fake_message(answers: list) -> SimpleNamespace:
+    async def answer(text, **kwargs):
+        answers.append(text)
+
+    return SimpleNamespace(from_user=SimpleNamespace(id=USER_ID, first_name="Ann", last_name=None), answer=answer)
+
+
+def test_second_profile_view_issues_no_sql(monkeypatch):
+    migrate(os.environ["BOT_DB_FILE"])
+    queries = []
+
+    def recording(method):
+        async def wrapper(sql, *args, **kwargs):
+            queries.append(sql)
+            return await method(sql, *args, **kwargs)
+        return wrapper
+
+    for name in ("fetchone", "fetchall", "execute", "write", "write_all"):
+        monkeypatch.setattr(db, name, recording(getattr(db, name)))
+
+    async def scenario():
+        try:
+            await user_profiles.save_profile(USER_ID, "ann", "Ann")
+            await add_topic.add_user_topic(USER_ID, "Profile cache test", 0)
+            topic_id = await db.fetchval("SELECT id FROM topics WHERE author_id = ?", (USER_ID,))
+            await add_topic.add_word_to_user_topic(USER_ID, topic_id, "cat", "кот", FakeState())
+            await add_topic.add_word_to_user_topic(USER_ID, topic_id, "dog", "собака", FakeState())
+
+            answers = []
+            await profile.check_profile(fake_message(answers), FakeState())
+            queries.clear()
+            await profile.check_profile(fake_message(answers), FakeState())
+            assert queries == []
+
+            # Счётчики в кэше совпадают с теми, что посчитали триггеры
+            counters = await db.fetchone("SELECT learned_words_count, topics_count FROM users WHERE user_id = ?",
+                                         (USER_ID,))
+            assert counters == (2, 1)
+            assert "<b>Изученные слова:</b> 2" in answers[-1]
+            assert "<b>Количество созданных тем:</b> 1" in answers[-1]
+        finally:
+            await db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from shared import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT
+
+
+# Функция для создания aiohttp-приложения, принимающего обновления от Telegram
+def create_webhook_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    app = web.Application()
+
+    # handle_in_background: Telegram сразу получает ответ 200, а обновление
+    # обрабатывается диспетчером в отдельной задаче параллельно с остальными
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=WEBHOOK_SECRET,
+    ).register(app, path=WEBHOOK_PATH)
+
+    # Запускает startup/shutdown хуки диспетчера вместе с приложением
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def set_webhook(bot: Bot, dp: Dispatcher) -> None:
+    url = f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}"
+    await bot.set_webhook(
+        url,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logging.info(f"Webhook set to {url}")
+
+
+# Запуск бота в режиме вебхука
+async def start_webhook(dp: Dispatcher, bot: Bot) -> None:
+    if not WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL must be set to run the bot in webhook mode")
+
+    app = create_webhook_app(dp, bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+    await site.start()
+    logging.info(f"Webhook server listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    try:
+        await set_webhook(bot, dp)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()